@@ -1,5 +1,7 @@
 from pypads.app.actuators import IActuators, actuator
 
+from pypads_padre.concepts.hashing import dataset_instance_ids
+from pypads_padre.concepts.parallel import execute_folds, SharedArrays
 from pypads_padre.concepts.splitter import default_split
 from pypads_padre.util import get_class_that_defined_method
 
@@ -48,3 +50,52 @@ class PadrePadsActuators(IActuators):
                 del kwargs[key]
         return self.pypads.api.track_splits(ctx=ctx, fn=default_split, mapping=None)(X, y=y, **kwargs)
 
+
+    @actuator
+    def parallel_folds(self, fn, X, y=None, n_jobs=None, **kwargs):
+        """
+        Function to execute a fold function on all splits of the default splitter in a process pool. X and y are
+        placed into shared memory once, every worker gets read only views on them together with the indices of its
+        fold. Workers are running untracked. The splits are tracked in this process and decisions returned by the
+        folds are logged for the split they belong to.
+
+         Options:
+         ========
+         - fn=callable             picklable function fn(X, y, train_idx, test_idx, val_idx) run for every fold. If it
+                                   returns a dict with an entry "predictions" (and optionally "probabilities") ordered
+                                   like test_idx, the decisions are tracked for the split of the fold.
+         - n_jobs=int              number of worker processes, default is the number of cpus
+         - Every option of the default_splitter
+        :return: List of the results of fn in the order of the folds. The references of the decision artifacts are
+        kept per split id in the run cache under "fold_decisions".
+        """
+        from pypads_padre.injections.loggers.decision_tracking import SingleInstanceTO
+        pads = self.pypads
+
+        # Track the splits in this process
+        folds = []
+        split_ids = []
+        for train, test, val in self.default_splitter(X, y=y, **kwargs):
+            folds.append((train, test, val))
+            split_ids.append(pads.cache.run_get("current_split") if pads.cache.run_exists("current_split") else None)
+
+        targets = y
+        if targets is None and pads.cache.run_exists("targets"):
+            targets = pads.cache.run_get("targets")
+
+        instance_ids = dataset_instance_ids(pads)
+
+        results = []
+        with SharedArrays(X, y) as shared:
+            for split_id, (train, test, val), result in zip(split_ids, folds, execute_folds(fn, shared, folds,
+                                                                                            n_jobs=n_jobs)):
+                if split_id is not None:
+                    pads.cache.run_add("current_split", split_id)
+                    if isinstance(result, dict) and result.get("predictions") is not None and test is not None:
+                        decisions = SingleInstanceTO(split_id=split_id, parent=pads.api.get_programmatic_output())
+                        decisions.add_decisions(test, result.get("predictions"), result.get("probabilities"),
+                                                targets, instance_ids)
+                        decisions.store()
+                        pads.cache.run_add("fold_decisions", {split_id: decisions.decisions_reference})
+                results.append(result)
+        return results
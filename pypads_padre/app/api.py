@@ -15,7 +15,7 @@ class PadrePadsApi(IApi):
 
     @cmd
     def track_dataset(self, fn, ctx=None, name=None, target_columns=None, metadata=None, mapping: Mapping = None,
-                      **kwargs):
+                      instance_key=None, **kwargs):
         """
         Manually wrap a function to track as dataset
         """
@@ -23,6 +23,7 @@ class PadrePadsApi(IApi):
             metadata = {}
         self.pypads.cache.run_add('dataset_name', name)
         self.pypads.cache.run_add('dataset_metadata', metadata)
+        self.pypads.cache.run_add('dataset_instance_key', instance_key)
         self.pypads.cache.run_add('dataset_kwargs', {**{"target_columns": target_columns}, **kwargs})
         return self.pypads.api.track(fn, ctx, ["pypads_dataset"], mapping=mapping)
 
@@ -21,3 +21,14 @@ class EstimatorRepository(Repository):
         :param kwargs:
         """
         super().__init__(*args, name="pypads_estimators", **kwargs)
+
+
+class SplitRepository(Repository):
+
+    def __init__(self, *args, **kwargs):
+        """
+        Repository holding the index sets of splits. Splits are stored once per dataset and content.
+        :param args:
+        :param kwargs:
+        """
+        super().__init__(*args, name="pypads_splits", **kwargs)
@@ -22,13 +22,16 @@ class PadrePadsDecorators(IDecorators):
 
     # ------------------------------------------- decorators --------------------------------
     @decorator
-    def dataset(self, mapping=None, name=None, target_columns=None, output_format=None, metadata=None, **kwargs):
+    def dataset(self, mapping=None, name=None, target_columns=None, output_format=None, metadata=None,
+                instance_key=None, **kwargs):
         """
         Decorator for your custom dataset loading function for automatic logging.
         :param name: Name of your given dataset.
         :param mapping: A mapping for additional injection.
         :param target_columns: indices/names of targets or labels columns in case the returned dataset is a single object.
         :param output_format: A dict describing the outputs of your custom function in case of multiple returned objects.
+        :param instance_key: index/name of a column holding a unique key of the instances. Instances are identified by
+        a hash of their content otherwise.
 
         Example:
             def load_data():
@@ -52,6 +55,7 @@ class PadrePadsDecorators(IDecorators):
                                           output_format=output_format,
                                           metadata=metadata,
                                           mapping=mapping,
+                                          instance_key=instance_key,
                                           **kwargs)
 
         return track_decorator
@@ -92,11 +96,11 @@ class PadrePadsDecorators(IDecorators):
                     fn_anchors.update({"forward": ["pypads_predict"]})
             elif track == "hyper-parameters":
                 fn_anchors.update({"__init__": ["pypads_params"]})
-            elif track == "model" or debugging:
-                fn_anchors.update({"__init__": ["pypads_model"]})
             elif track == "output":
                 if hasattr(ctx, "forward"):
                     fn_anchors.update({"forward": ["pypads_predict"]})
+            if track == "model" or debugging:
+                fn_anchors["__init__"] = fn_anchors.get("__init__", []) + ["pypads_model"]
             if fn_anchors != {}:
                 return self.api.track_model(cls, ctx=ctx, fn_anchors=fn_anchors, mappings=mappings)
             else:
@@ -10,7 +10,7 @@ from pypads.utils.util import dict_merge_caches, dict_merge
 
 from pypads_padre.app.actuators import PadrePadsActuators
 from pypads_padre.app.api import PadrePadsApi
-from pypads_padre.app.backends.repository import DatasetRepository, EstimatorRepository
+from pypads_padre.app.backends.repository import DatasetRepository, EstimatorRepository, SplitRepository
 from pypads_padre.app.decorators import PadrePadsDecorators
 from pypads_padre.app.results import PadrePadsResults
 from pypads_padre.app.validators import PadrePadsValidators
@@ -20,6 +20,8 @@ from pypads_padre.bindings.events import DEFAULT_PADRE_LOGGING_FNS
 
 # --- Pypads App ---
 from pypads_padre.bindings.hooks import DEFAULT_PADRE_HOOK_MAPPING
+from pypads_padre.bindings.mapping_cache import LazyMappingFile
+from pypads_padre.bindings.reentrancy import DEFAULT_NON_REENTRANT_ANCHORS, init_reentrancy
 
 DEFAULT_PADRE_SETUP_FNS = set()
 
@@ -28,11 +30,33 @@ DEFAULT_PADRE_SETUP_FNS = set()
 # but define events on which different logging functions can listen.
 # This config defines such a listening structure.
 # {"recursive": track functions recursively. Otherwise check the callstack to only track the top level function.}
+# {"mapping_cache": load mapping files from their binary caches instead of parsing the yaml files on every start.
+# The mappings of a library are only loaded when the library is imported.}
+# {"non_reentrant_anchors": only track the outermost call hooked on one of these anchors. Calls nested in it which are
+# hooked on the same anchor (e.g. metrics computed by other metrics) run without loggers.}
 DEFAULT_PADRE_CONFIG = {
-    "use_pypads_default_mappings": False
+    "use_pypads_default_mappings": False,
+    "mapping_cache": True,
+    "non_reentrant_anchors": DEFAULT_NON_REENTRANT_ANCHORS
 }
 
 
+def _load_cached_mapping(self, path):
+    """
+    Adds a mapping file to the registry without loading its mappings. They are loaded when the library of the mapping
+    file is imported, from a cache built for the current content of the file if possible. Caches are looked up next to
+    the mapping file (see pypads_padre.bindings.mapping_cache) and in the folder of pypads, where they are written to
+    if missing. Mapping files are parsed right away if "mapping_cache" is disabled in the config of pypads.
+    :param path: Path to the mapping file.
+    :return:
+    """
+    if not self._pypads.config.get("mapping_cache", True):
+        self.add_mapping(mappings.MappingFile(path))
+        return
+    folder = os.path.join(self._pypads.folder, "mapping_cache") if self._pypads.folder else None
+    self.add_mapping(LazyMappingFile(path, folders=[folder] if folder else None, write_folder=folder))
+
+
 def configure_plugin(pypads,*args,**kwargs):
     """
     This function can be used to configure the plugin. It should be called at least once to allow for the usage of the
@@ -53,19 +77,23 @@ def configure_plugin(pypads,*args,**kwargs):
         mappings.default_mapping_file_paths = glob.glob(
             os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "bindings",
                                          "resources", "mapping", "**.yml")))
+    mappings.MappingRegistry.load_mapping = _load_cached_mapping
     base.DEFAULT_SETUP_FNS = base.DEFAULT_SETUP_FNS | DEFAULT_PADRE_SETUP_FNS
     base.DEFAULT_CONFIG = dict_merge(base.DEFAULT_CONFIG, DEFAULT_PADRE_CONFIG, str_to_set=True)
     events.DEFAULT_LOGGING_FNS = dict_merge(events.DEFAULT_LOGGING_FNS, DEFAULT_PADRE_LOGGING_FNS, str_to_set=True)
     hooks.DEFAULT_HOOK_MAPPING = dict_merge(hooks.DEFAULT_HOOK_MAPPING, DEFAULT_PADRE_HOOK_MAPPING, str_to_set=True)
     init_event_types()
     init_anchors()
+    init_reentrancy()
 
     def add_repositories(instance):
         setattr(instance, "_dataset_repository", DatasetRepository())
         setattr(instance, "_estimator_repository", EstimatorRepository())
+        setattr(instance, "_split_repository", SplitRepository())
 
         PyPads.dataset_repository = property(lambda self: self._dataset_repository)
         PyPads.estimator_repository = property(lambda self: self._estimator_repository)
+        PyPads.split_repository = property(lambda self: self._split_repository)
 
     pypads.add_instance_modifier(add_repositories)
 
@@ -1,4 +1,5 @@
-from pypads.app.results import IResults
+from pypads.app.results import IResults, result
+from pypads.utils.logging_util import FileFormats
 
 
 class PadrePadsResults(IResults):
@@ -9,3 +10,37 @@ class PadrePadsResults(IResults):
     def pypads(self):
         from pypads.app.pypads import get_current_pads
         return get_current_pads()
+
+    @result
+    def get_split(self, uid):
+        """
+        Loads the index sets of a split out of the split repository without recomputing it.
+        :param uid: Id of the split as it is given in the tracked splits. This is the hash over the dataset fingerprint
+        and the content of the index sets.
+        :return: Tuple of (train, test, validation) index sets or None if the split isn't known to the repository.
+        """
+        repository = self.pypads.split_repository
+        if not repository.has_object(uid=str(uid)):
+            return None
+        repo_obj = repository.get_object(uid=str(uid))
+        indices = self.pypads.results.load_artifact("split_indices.pickle", run_id=repo_obj.run_id,
+                                                    read_format=FileFormats.pickle)
+        if indices is None:
+            return None
+        return indices.get("train"), indices.get("test"), indices.get("validation")
+
+    @result
+    def get_decisions(self, decisions_reference, run_id=None, dense=True):
+        """
+        Loads the decision columns of a tracked split.
+        :param decisions_reference: decisions_reference of the tracked instance based results
+        :param run_id: Run the decisions were tracked in. Defaults to the active run.
+        :param dense: Reconstruct the dense probability matrix if the probabilities were stored encoded.
+        :return: Dict of the decision columns
+        """
+        from pypads_padre.concepts.decisions import read_decisions
+        if not run_id:
+            run_id = self.pypads.api.active_run().info.run_id
+        return read_decisions(self.pypads.backend.download_tmp_artifacts(run_id=run_id,
+                                                                         relative_path=decisions_reference),
+                              dense=dense)
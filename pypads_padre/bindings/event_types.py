@@ -7,6 +7,7 @@ DEFAULT_PADRE_EVENT_TYPES = [EventType("dataset", "A function returning a datase
                                        "A function being the execution of a single parameter search run"),
                              EventType("splits", "A function providing a splitting for the dataset."),
                              EventType("hyperparameters", "A function providing hyperparameters"),
+                             EventType("model", "A model whose weights and gradients are watched during training"),
                              EventType("doc", "A function providing for critical docs for the type of experiment")]
 
 
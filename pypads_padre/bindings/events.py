@@ -7,18 +7,18 @@ from pypads_padre.injections.loggers.dataset import DatasetILF
 from pypads_padre.injections.loggers.decision_tracking import SingleInstanceILF, DecisionsKerasILF, DecisionsSklearnILF, \
     DecisionsTorchILF
 from pypads_padre.injections.loggers.estimator import EstimatorILF
-from pypads_padre.injections.loggers.metric import MetricTorch
+from pypads_padre.injections.loggers.metric import MetricTorch, MetricSklearn
 
 # Extended mappings. We allow to log parameters, output or input, datasets
 DEFAULT_PADRE_LOGGING_FNS = {
     "dataset": DatasetILF(),
     "hyperparameters": ParametersTorchILF(),
-    # "model": TorchModelILF(),
+    "model": TorchModelILF(),
     "predictions": [DecisionsSklearnILF(), DecisionsTorchILF(), DecisionsKerasILF(), SingleInstanceILF()],
     # "parameter_search": ParameterSearchILF(),
     # "parameter_search_executor": ParameterSearchExecutor(),
     "splits": [SplitILF(),SplitILFTorch()],
     # "doc": DocExtractionILF(),
-    "metric": [MetricTorch()],
+    "metric": [MetricTorch(), MetricSklearn()],
     "estimator": EstimatorILF()
 }
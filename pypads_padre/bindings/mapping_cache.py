@@ -0,0 +1,307 @@
+import glob
+import hashlib
+import os
+import pickle
+import re
+import time
+
+import yaml
+from pypads import logger
+from pypads.importext.mappings import MappingFile, MappingCollection
+from pypads.importext.package_path import RegexMatcher
+from pypads.utils.util import persistent_hash
+
+# Version of the cache format. Caches of other versions are ignored and rebuilt.
+MAPPING_CACHE_VERSION = 1
+MAPPING_CACHE_FOLDER = "__mapping_cache__"
+
+DEFAULT_MAPPING_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), "resources", "mapping"))
+
+
+def default_mapping_paths():
+    return glob.glob(os.path.join(DEFAULT_MAPPING_FOLDER, "**.yml"))
+
+
+def _pypads_version():
+    import pypads
+    return getattr(pypads, "__version__", None)
+
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def cache_path(path, folder=None):
+    """
+    Path of the binary cache of a mapping file.
+    :param path: Path to the mapping file
+    :param folder: Folder holding the cache. Defaults to a cache folder next to the mapping file.
+    :return: Path of the cache
+    """
+    if folder is None:
+        folder = os.path.join(os.path.dirname(path), MAPPING_CACHE_FOLDER)
+    return os.path.join(folder, os.path.basename(path) + ".pickle")
+
+
+def _header(path, file_hash=None):
+    return {"version": MAPPING_CACHE_VERSION, "pypads": _pypads_version(),
+            "hash": file_hash or _file_hash(path)}
+
+
+def read_cache(path, folder=None, file_hash=None):
+    """
+    Loads a compiled mapping file if its cache exists and was built from the current content of the file by the same
+    cache format and pypads version.
+    :return: MappingFile or None if there is no valid cache
+    """
+    cached = cache_path(path, folder)
+    if not os.path.exists(cached):
+        return None
+    try:
+        with open(cached, "rb") as f:
+            if pickle.load(f) != _header(path, file_hash):
+                return None
+            mapping = pickle.load(f)
+    except Exception as e:
+        logger.warning("Couldn't read the cache {} of mapping file {} because {}".format(cached, path, str(e)))
+        return None
+    mapping.path = path
+    return mapping
+
+
+def write_cache(path, mapping: MappingFile = None, folder=None, file_hash=None):
+    """
+    Compiles a mapping file into its binary cache. The cache holds a header identifying the content of the file
+    followed by the pickled mapping collection with its matchers already built.
+    :param path: Path to the mapping file
+    :param mapping: Already parsed mapping file. Parses the file if not given.
+    :param folder: Folder to write the cache to
+    :return: Path of the cache
+    """
+    if mapping is None:
+        mapping = MappingFile(path)
+    cached = cache_path(path, folder)
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    # Write to a temporary file first to never leave a partial cache behind
+    tmp = "{}.{}.tmp".format(cached, os.getpid())
+    with open(tmp, "wb") as f:
+        pickle.dump(_header(path, file_hash), f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(mapping, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, cached)
+    return cached
+
+
+def load_mapping_file(path, folders=None, write_folder=None):
+    """
+    Loads a mapping file from the first valid cache in the given folders. If there is none the yaml file is parsed and
+    compiled into a cache in write_folder.
+    :param path: Path to the mapping file
+    :param folders: Folders to look for caches in. The folder next to the mapping file is always checked first.
+    :param write_folder: Folder to write a new cache to. No cache is written if None.
+    :return: MappingFile
+    """
+    file_hash = _file_hash(path)
+    for folder in [None] + list(folders or []):
+        mapping = read_cache(path, folder, file_hash)
+        if mapping is not None:
+            return mapping
+
+    mapping = MappingFile(path)
+    if write_folder is not None:
+        try:
+            write_cache(path, mapping, write_folder, file_hash)
+        except Exception as e:
+            logger.warning("Couldn't write the cache of mapping file {} because {}".format(path, str(e)))
+    return mapping
+
+
+def read_metadata(content):
+    """
+    Extracts the top level metadata block of a mapping file by scanning its lines instead of parsing the whole yaml.
+    :param content: Content of the mapping file
+    :return: Dict of the metadata or None if the file has no metadata block
+    """
+    lines = []
+    for line in content.splitlines(keepends=True):
+        if len(lines) == 0:
+            if line.startswith("metadata:"):
+                lines.append(line)
+        elif line.strip() == "" or line[0].isspace() or line.startswith("#"):
+            lines.append(line)
+        else:
+            break
+    if len(lines) == 0:
+        return None
+    return yaml.load("".join(lines), Loader=yaml.SafeLoader)["metadata"]
+
+
+class _CompiledNode:
+    """
+    Compiled lookup of the children of a node of the mapping trie. Regex segments are compiled once and combined into a
+    single alternation which rejects segments matching none of them in one test. The matching children are memoized
+    per segment.
+    """
+
+    def __init__(self, node):
+        self.node = node
+        self.regexes = [(re.compile(k.content), v) for k, v in node.items() if isinstance(k, RegexMatcher)]
+        self.combined = None
+        if len(self.regexes) > 1:
+            try:
+                self.combined = re.compile("|".join("(?:{})".format(p.pattern) for p, _ in self.regexes))
+            except re.error:
+                self.combined = None
+        self._children = {}
+        self.mappings = None  # All mappings below the node
+
+    def children(self, segment):
+        """
+        :return: Child nodes of the node matching the segment
+        """
+        key = segment.content
+        if key not in self._children:
+            children = [self.node[segment]] if segment in self.node else []
+            if len(self.regexes) > 0 and (self.combined is None or self.combined.match(key)):
+                children.extend(v for p, v in self.regexes if p.match(key))
+            self._children[key] = children
+        return self._children[key]
+
+
+class LazyMappingFile(MappingFile):
+    """
+    Mapping file of which only the metadata is read when it is added to the registry. The mappings themselves are
+    loaded from the cache or parsed from the yaml file on their first lookup, which happens when a module of the
+    library is imported. Lookups walk the mapping trie once, testing the regex segments of a node at once.
+    """
+
+    def __init__(self, path, folders=None, write_folder=None, name=None):
+        with open(path, encoding='utf-8') as f:
+            data = f.read()
+        metadata = read_metadata(data)
+        if metadata is None:
+            raise ValueError("Mapping file {} doesn't define its metadata.".format(path))
+        self.path = path
+        self._folders = folders
+        self._write_folder = write_folder
+        self._loaded = False
+        self._compiled = {}
+        MappingCollection.__init__(self, name or os.path.basename(path), metadata["version"], metadata["library"],
+                                   metadata.get("author", None))
+
+        # computing the hash of the mapping file
+        self._hash = persistent_hash(data)
+        self.uid = self._hash
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            mapping = load_mapping_file(self.path, self._folders, self._write_folder)
+        except Exception as e:
+            logger.warning("Couldn't load the mappings of {} because {}".format(self.path, str(e)))
+            return
+        for m in mapping._get_all_mappings():
+            m.in_collection = self
+        self._mappings = mapping.mappings
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    @property
+    def mappings(self):
+        self._load()
+        return self._mappings
+
+    def add_mapping(self, mapping):
+        self._load()
+        super().add_mapping(mapping)
+        self._compiled = {}
+
+    def _get_all_mappings(self, current_path=None):
+        if current_path is None:
+            self._load()
+        return super()._get_all_mappings(current_path)
+
+    def _node(self, node):
+        compiled = self._compiled.get(id(node), None)
+        if compiled is None:
+            compiled = _CompiledNode(node)
+            self._compiled[id(node)] = compiled
+        return compiled
+
+    def find_mappings(self, segments, current_path=None):
+        """
+        Find all mappings matching given segments by a single walk over the compiled mapping trie. Only the nodes on
+        the walk get compiled.
+        :param segments: Segments to look for
+        :param current_path: Place in the mapping dict from which we are looking in mapping dict.
+        :return:
+        """
+        if current_path is None:
+            self._load()
+            current_path = self._mappings
+        nodes = [current_path]
+        for segment in segments:
+            nodes = [child for node in nodes for child in self._node(node).children(segment)]
+            if len(nodes) == 0:
+                return []
+        mappings = []
+        for node in nodes:
+            compiled = self._node(node)
+            if compiled.mappings is None:
+                compiled.mappings = super()._get_all_mappings(node)
+            mappings = mappings + compiled.mappings
+        return mappings
+
+
+def compile_mappings(paths=None, folder=None):
+    """
+    Build step compiling mapping files into their binary caches.
+    :param paths: Paths to the mapping files. Defaults to the mapping files of the plugin.
+    :param folder: Folder to write the caches to. Defaults to a cache folder next to each mapping file.
+    :return: Paths of the caches
+    """
+    return [write_cache(path, folder=folder) for path in (paths or default_mapping_paths())]
+
+
+def benchmark(paths=None, repeat=3):
+    """
+    Compares the time to load mapping files from yaml to loading them from their caches.
+    :return: Dict of mapping file name to a tuple of the best yaml and cache load time in seconds
+    """
+    import tempfile
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for path in (paths or default_mapping_paths()):
+            write_cache(path, folder=folder)
+            timings = []
+            for load in [lambda: MappingFile(path), lambda: read_cache(path, folder)]:
+                best = None
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    load()
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                timings.append(best)
+            results[os.path.basename(path)] = tuple(timings)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile the pypads padre mapping files into binary caches.")
+    parser.add_argument("paths", nargs="*", help="Mapping files to compile. Defaults to the ones of the plugin.")
+    parser.add_argument("--folder", default=None, help="Folder to write the caches to.")
+    parser.add_argument("--benchmark", action="store_true", help="Compare loading from yaml and from the caches.")
+    arguments = parser.parse_args()
+
+    if arguments.benchmark:
+        for name, (yml, cached) in benchmark(arguments.paths).items():
+            print("{}: yaml {:.3f}s, cache {:.3f}s ({:.1f}x)".format(name, yml, cached, yml / max(cached, 1e-9)))
+    else:
+        for cached in compile_mappings(arguments.paths, arguments.folder):
+            print("Compiled " + cached)
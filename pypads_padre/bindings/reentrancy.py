@@ -0,0 +1,56 @@
+from pypads import logger
+from pypads.importext.wrapping.function_wrapping import FunctionWrapper
+
+# Anchors of which only the outermost hooked call on the call stack is tracked
+DEFAULT_NON_REENTRANT_ANCHORS = ["pypads_metric", "pypads_predict"]
+
+_is_skip_recursion = FunctionWrapper._is_skip_recursion
+
+
+def call_anchors(call_id):
+    """
+    Names of the anchors a call is hooked on.
+    :param call_id: Id of the call
+    :return: Set of anchor names
+    """
+    metas = call_id.context.get_wrap_metas(call_id.wrappee) or []
+    return {getattr(hook.anchor, "name", hook.anchor) for meta in metas for hook in meta.mapping.hooks}
+
+
+def is_nested_call(call_stack, call_id, anchors):
+    """
+    Checks if a call is nested in another call hooked on the same anchor. E.g. f1_score calling
+    precision_recall_fscore_support which are both metrics or a pipeline predicting with its final estimator.
+    :param call_stack: Stack of the tracked calls. The call itself is the last one.
+    :param call_id: Id of the call
+    :param anchors: Anchors to check
+    :return: True if an enclosing call shares an anchor out of anchors with the call
+    """
+    shared = call_anchors(call_id).intersection(anchors)
+    if len(shared) == 0:
+        return False
+    for call in call_stack[:-1]:
+        if not call_anchors(call.call_id).isdisjoint(shared):
+            return True
+    return False
+
+
+def _is_skip_nested(self, accessor):
+    """
+    Skips the hooks of calls nested in calls on the same non reentrant anchor (config "non_reentrant_anchors"). The
+    nested call executes the original function without any logger.
+    """
+    if _is_skip_recursion(self, accessor):
+        return True
+    anchors = self._pypads.config.get("non_reentrant_anchors", None)
+    if not anchors:
+        return False
+    try:
+        return is_nested_call(self._pypads.call_tracker.call_stack, accessor, anchors)
+    except Exception as e:
+        logger.debug("Couldn't check the nesting of {} because {}".format(accessor, str(e)))
+        return False
+
+
+def init_reentrancy():
+    FunctionWrapper._is_skip_recursion = _is_skip_nested
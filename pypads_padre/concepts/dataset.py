@@ -6,6 +6,7 @@ from pypads import logger
 from pypads.app.base import tracking_active
 from pypads.utils.util import is_package_available
 
+from pypads_padre.concepts.hashing import row_hashes
 from pypads_padre.concepts.util import _tolist
 
 
@@ -326,3 +327,30 @@ def tuple_crawler(obj: Crawler, output_format, **kwargs):
 
 
 Crawler.register_fn(Types.tuple.value, tuple_crawler)
+
+
+# --- instance identifiers ---
+def instance_ids(data, key=None, hashes=None):
+    """
+    Builds a compact column identifying the instances of a crawled dataset independent of their position.
+    :param data: Crawled dataset
+    :param key: index/name of a column holding a user declared key. For datasets consisting of multiple parts the first
+    part holding the column is used.
+    :param hashes: Already computed row hashes of the dataset. These are used as ids if no key is declared.
+    :return: Array of instance ids
+    """
+    import numpy as np
+    if key is None:
+        return hashes if hashes is not None else row_hashes(data)
+    if isinstance(data, dict):
+        for part in data.values():
+            try:
+                return instance_ids(part, key=key)
+            except (KeyError, IndexError, TypeError):
+                continue
+        raise KeyError("No part of the dataset holds the instance key {}".format(key))
+    if is_package_available('pandas'):
+        from pandas import DataFrame
+        if isinstance(data, DataFrame):
+            return data[key].values
+    return np.asarray(data)[:, key]
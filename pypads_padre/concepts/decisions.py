@@ -0,0 +1,272 @@
+import os
+import pickle
+
+import numpy as np
+
+DEFAULT_ROW_GROUP_SIZE = 65536
+
+
+def is_sparse(x):
+    return hasattr(x, "tocsr") and hasattr(x, "nnz")
+
+
+def column(values):
+    """
+    Converts values into a typed decision column without coercing them. Sparse matrices (e.g. multi-label indicator
+    matrices) are kept sparse, lists of per output probability matrices are stacked to (instances, outputs, classes).
+    :param values: array-like values with one row per decision
+    :return: numpy array or sparse csr matrix
+    """
+    if values is None:
+        return None
+    if is_sparse(values):
+        return values.tocsr()
+    if isinstance(values, list) and len(values) > 0 and all(getattr(v, "ndim", 0) == 2 for v in values) \
+            and len({v.shape for v in values}) == 1:
+        return np.stack(values, axis=1)
+    return np.asarray(values)
+
+
+def mismatches(predictions, truth):
+    """
+    Compares predictions and truth row wise.
+    :return: Boolean array being True for each row where any value of the prediction doesn't match the truth
+    """
+    if is_sparse(predictions) or is_sparse(truth):
+        from scipy.sparse import csr_matrix
+        diff = csr_matrix(predictions) != csr_matrix(truth)
+        return np.asarray(diff.getnnz(axis=1)) > 0
+    wrong = np.asarray(predictions != truth)
+    if wrong.ndim > 1:
+        wrong = wrong.reshape(len(wrong), -1).any(axis=1)
+    return wrong
+
+
+def take(columns, positions):
+    """
+    Takes the given rows out of a dict of decision columns.
+    """
+    return {key: column_[positions] for key, column_ in columns.items()}
+
+
+def concatenate(parts):
+    """
+    Concatenates a list of dicts of decision columns row wise.
+    """
+    if len(parts) == 0:
+        return {}
+    if len(parts) == 1:
+        return parts[0]
+
+    def _concatenate(values):
+        if any(is_sparse(v) for v in values):
+            from scipy.sparse import vstack, csr_matrix
+            return vstack([csr_matrix(v) for v in values]).tocsr()
+        return np.concatenate(values)
+
+    return {key: _concatenate([part[key] for part in parts]) for key in parts[0].keys()}
+
+
+def rows(columns):
+    return next(iter(columns.values())).shape[0] if columns else 0
+
+
+def _slice_rows(x, start, stop):
+    if hasattr(x, "iloc"):
+        return x.iloc[start:stop]
+    return x[start:stop]
+
+
+def map_chunks(fn, x, chunk_size, n_jobs=None):
+    """
+    Applies fn to consecutive row chunks of x and yields the results in order. With n_jobs > 1 the chunks are run on a
+    thread pool, which only pays off for functions releasing the GIL (e.g. numpy, BLAS or cython nogil code). At most
+    n_jobs chunks are in flight, such that the memory held by results is bounded by n_jobs chunks.
+    :param fn: Function called on a row chunk of x
+    :param x: numpy array, sparse matrix, pandas object or list with one row per instance
+    :param chunk_size: Number of rows per chunk
+    :param n_jobs: Number of threads. None or 1 runs the chunks sequentially.
+    :return: Generator of tuples of the start row and the result of the chunk
+    """
+    from pypads_padre.concepts.util import _len
+    n = _len(x)
+    starts = range(0, n, chunk_size)
+    if n_jobs is None or n_jobs <= 1 or len(starts) <= 1:
+        for start in starts:
+            yield start, fn(_slice_rows(x, start, start + chunk_size))
+        return
+
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        pending = deque()
+        for start in starts:
+            if len(pending) >= n_jobs:
+                done_start, future = pending.popleft()
+                yield done_start, future.result()
+            pending.append((start, executor.submit(fn, _slice_rows(x, start, start + chunk_size))))
+        while pending:
+            done_start, future = pending.popleft()
+            yield done_start, future.result()
+
+
+PROBABILITY_ENCODINGS = ["dense", "float32", "float16", "topk", "sparse"]
+
+
+class ProbabilityEncoding:
+    """
+    Encoding of the probability column of the decisions. Probabilities are encoded per row group when written.
+
+    Encodings:
+    - dense: keep the probabilities as they are
+    - float32 / float16: dense probabilities with a reduced precision
+    - topk: the k highest probabilities of each decision with their class indices
+    - sparse: only probabilities of at least threshold with their class indices
+    """
+
+    def __init__(self, encoding="dense", top_k=5, threshold=0.01):
+        if encoding not in PROBABILITY_ENCODINGS:
+            raise ValueError("Unknown probability encoding {}. Use one of {}.".format(encoding, PROBABILITY_ENCODINGS))
+        self.encoding = encoding
+        self.top_k = top_k
+        self.threshold = threshold
+
+    def __str__(self):
+        if self.encoding == "topk":
+            return "topk(k={})".format(self.top_k)
+        if self.encoding == "sparse":
+            return "sparse(threshold={})".format(self.threshold)
+        return self.encoding
+
+    def encode(self, probabilities):
+        """
+        Encodes the probabilities of a row group.
+        :param probabilities: Dense probability matrix of the row group
+        :return: Dict holding the encoding and its arrays
+        """
+        n, classes = probabilities.shape[0], int(np.prod(probabilities.shape[1:]))
+        encoded = {"encoding": self.encoding, "shape": probabilities.shape}
+        if self.encoding in ["dense", "float32", "float16"]:
+            encoded["values"] = probabilities if self.encoding == "dense" else probabilities.astype(self.encoding)
+            return encoded
+
+        flat = probabilities.reshape(n, classes)
+        index_type = np.int16 if classes <= np.iinfo(np.int16).max else np.int32
+        if self.encoding == "topk":
+            k = min(self.top_k, classes)
+            indices = np.argpartition(-flat, k - 1, axis=1)[:, :k]
+            values = np.take_along_axis(flat, indices, axis=1)
+            order = np.argsort(-values, axis=1)
+            encoded["indices"] = np.take_along_axis(indices, order, axis=1).astype(index_type)
+            encoded["values"] = np.take_along_axis(values, order, axis=1).astype(np.float32)
+        else:
+            mask = flat >= self.threshold
+            encoded["indptr"] = np.concatenate([[0], np.cumsum(np.count_nonzero(mask, axis=1))]).astype(np.int64)
+            encoded["indices"] = np.nonzero(mask)[1].astype(index_type)
+            encoded["values"] = flat[mask].astype(np.float32)
+        return encoded
+
+    @staticmethod
+    def decode(encoded):
+        """
+        Reconstructs the dense probability matrix of a row group. Probabilities not kept by the encoding are zero.
+        :param encoded: Dict returned by encode
+        :return: Dense probability matrix
+        """
+        if encoded["encoding"] in ["dense", "float32", "float16"]:
+            return encoded["values"]
+        shape = encoded["shape"]
+        n, classes = shape[0], int(np.prod(shape[1:]))
+        dense = np.zeros((n, classes), dtype=encoded["values"].dtype)
+        if encoded["encoding"] == "topk":
+            np.put_along_axis(dense, encoded["indices"].astype(np.int64), encoded["values"], axis=1)
+        else:
+            rows_ = np.repeat(np.arange(n), np.diff(encoded["indptr"]))
+            dense[rows_, encoded["indices"]] = encoded["values"]
+        return dense.reshape(shape)
+
+
+class DecisionSink:
+    """
+    Appends decision columns as row groups of a fixed size to a file on disk. At most one row group is held in memory
+    independent of the number of decisions written.
+    """
+
+    def __init__(self, path, row_group_size=DEFAULT_ROW_GROUP_SIZE, encoding: ProbabilityEncoding = None):
+        self.path = path
+        self.row_group_size = row_group_size
+        self.encoding = encoding
+        self.rows = 0
+        self._buffer = []
+        self._buffered = 0
+        self._fd = None
+
+    def append(self, columns):
+        """
+        Appends decisions given as a dict of columns with an equal number of rows.
+        :param columns: Decision columns
+        """
+        n = rows(columns)
+        if n == 0:
+            return
+        self._buffer.append(columns)
+        self._buffered += n
+        self.rows += n
+        while self._buffered >= self.row_group_size:
+            buffered = concatenate(self._buffer)
+            self._write(take(buffered, slice(0, self.row_group_size)))
+            rest = take(buffered, slice(self.row_group_size, None))
+            self._buffered -= self.row_group_size
+            self._buffer = [rest] if self._buffered > 0 else []
+
+    def _write(self, columns):
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._fd = open(self.path, "wb")
+        if self.encoding is not None and "probabilities" in columns:
+            columns = dict(columns)
+            columns["probabilities"] = self.encoding.encode(columns["probabilities"])
+        pickle.dump(columns, self._fd, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        """
+        Writes the remaining decisions and closes the file.
+        :return: Path of the file or None if no decisions were written
+        """
+        if self._buffered > 0:
+            self._write(concatenate(self._buffer))
+        self._buffer, self._buffered = [], 0
+        if self._fd is None:
+            return None
+        self._fd.close()
+        self._fd = None
+        return self.path
+
+
+def read_decisions(path, dense=True):
+    """
+    Reads the decision columns written by a DecisionSink.
+    :param path: Path of the decisions file
+    :param dense: Reconstruct the dense probability matrix out of encoded probabilities. Otherwise the encoded
+    probabilities of the row groups are returned as a list.
+    :return: Dict of the decision columns
+    """
+    groups = []
+    encoded = []
+    with open(path, "rb") as fd:
+        while True:
+            try:
+                group = pickle.load(fd)
+            except EOFError:
+                break
+            if isinstance(group.get("probabilities"), dict):
+                probabilities = group.pop("probabilities")
+                if dense:
+                    group["probabilities"] = ProbabilityEncoding.decode(probabilities)
+                else:
+                    encoded.append(probabilities)
+            groups.append(group)
+    columns = concatenate(groups)
+    if len(encoded) > 0:
+        columns["probabilities"] = encoded
+    return columns
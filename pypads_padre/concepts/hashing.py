@@ -0,0 +1,109 @@
+import hashlib
+
+import numpy as np
+
+from pypads_padre.concepts.util import _len
+
+_OFFSET = np.uint64(0xcbf29ce484222325)
+_PRIME = np.uint64(0x100000001b3)
+_SHIFT = np.uint64(32)
+
+
+def _mix(h, words):
+    h ^= words
+    h *= _PRIME
+    h ^= h >> _SHIFT
+    return h
+
+
+def _object_row_hashes(arr):
+    """
+    Hashes the rows of an object array (e.g. mixed or string columns) one by one if pandas isn't available.
+    """
+    return np.fromiter((int.from_bytes(hashlib.blake2b(repr(tuple(row)).encode("utf-8"), digest_size=8).digest(),
+                                       "little") for row in arr), dtype=np.uint64, count=len(arr))
+
+
+def row_hashes(data):
+    """
+    Computes a 64 bit content hash for every row of a dataset. The rows are hashed in a single vectorized pass over
+    their 8 byte words instead of hashing row by row in python.
+    :param data: numpy array, pandas object or dict of parts with an equal number of rows
+    :return: uint64 array holding one hash per row
+    """
+    try:
+        import pandas
+        if isinstance(data, (pandas.DataFrame, pandas.Series)):
+            return pandas.util.hash_pandas_object(data, index=False).values.astype(np.uint64)
+    except ImportError:
+        pass
+
+    if isinstance(data, dict):
+        parts = [row_hashes(part) for part in data.values()]
+        if len(parts) == 0 or any(len(p) != len(parts[0]) for p in parts):
+            raise ValueError("Parts of the dataset don't share the same number of rows.")
+        h = np.full(len(parts[0]), _OFFSET, dtype=np.uint64)
+        for part in parts:
+            h = _mix(h, part)
+        return h
+
+    arr = np.asarray(data)
+    n = _len(arr)
+    arr = arr.reshape(n, -1)
+    if arr.dtype.hasobject:
+        try:
+            import pandas
+            return pandas.util.hash_pandas_object(pandas.DataFrame(arr), index=False).values.astype(np.uint64)
+        except ImportError:
+            return _object_row_hashes(arr)
+    if arr.dtype.kind == "f":
+        # Normalize negative zeros
+        arr = arr + 0.0
+
+    raw = np.ascontiguousarray(arr).view(np.uint8).reshape(n, -1)
+    padding = (-raw.shape[1]) % 8
+    if padding:
+        raw = np.concatenate([raw, np.zeros((n, padding), dtype=np.uint8)], axis=1)
+    words = raw.view(np.uint64)
+
+    h = np.full(n, _OFFSET, dtype=np.uint64)
+    for j in range(words.shape[1]):
+        h = _mix(h, words[:, j])
+    return h
+
+
+def dataset_row_hashes(pads):
+    """
+    :return: Row hashes of the dataset tracked in the current run or None
+    """
+    return pads.cache.run_get("dataset_row_hashes") if pads.cache.run_exists("dataset_row_hashes") else None
+
+
+def dataset_instance_ids(pads):
+    """
+    :return: Instance ids of the dataset tracked in the current run or None
+    """
+    return pads.cache.run_get("dataset_instance_ids") if pads.cache.run_exists("dataset_instance_ids") else None
+
+
+def split_duplicates(hashes, train_set=None, test_set=None, val_set=None):
+    """
+    Detects leakage and duplicates of a split by joining the row hashes of its index sets.
+    :param hashes: Row hashes of the dataset the index sets point into
+    :return: Dict holding the number of test and validation instances also found in the training set, the number of
+    test instances also found in the validation set and the number of exact duplicate instances in the split.
+    """
+
+    def _hashes(idx):
+        if idx is None or len(idx) == 0:
+            return np.empty(0, dtype=np.uint64)
+        return hashes[np.asarray(idx, dtype=np.int64)]
+
+    train, test, val = _hashes(train_set), _hashes(test_set), _hashes(val_set)
+    instances = np.concatenate([train, test, val])
+    return {
+        "test_in_train": int(np.count_nonzero(np.isin(test, train))),
+        "validation_in_train": int(np.count_nonzero(np.isin(val, train))),
+        "test_in_validation": int(np.count_nonzero(np.isin(test, val))),
+        "duplicates": int(len(instances) - len(np.unique(instances)))
+    }
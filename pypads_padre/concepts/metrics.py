@@ -0,0 +1,132 @@
+import math
+import os
+
+import numpy as np
+
+METRIC_AGGREGATES = ["mean", "min", "max", "last", "count"]
+
+# Record of a metric point in the append-only point files
+POINT_DTYPE = np.dtype([("step", "<i8"), ("value", "<f8"), ("timestamp", "<i8")])
+
+
+class MetricWindow:
+    """
+    Aggregates the points of a metric over windows. A window closes after steps points or when a point is at least
+    seconds after the first point of the window, whatever comes first. Without steps and seconds every point is a
+    window of its own.
+
+    Aggregates:
+    - mean / min / max: of the values in the window
+    - last: last value in the window
+    - count: number of points in the window
+    """
+
+    def __init__(self, steps=None, seconds=None, aggregates=("mean", "min", "max", "last")):
+        unknown = [a for a in aggregates if a not in METRIC_AGGREGATES]
+        if len(unknown) > 0:
+            raise ValueError("Unknown metric aggregates {}. Use some of {}.".format(unknown, METRIC_AGGREGATES))
+        if len(aggregates) == 0:
+            raise ValueError("At least one metric aggregate is needed.")
+        if steps is not None and steps < 1 or seconds is not None and seconds <= 0:
+            raise ValueError("Metric windows need a positive number of steps or seconds.")
+        self.steps = steps
+        self.seconds = seconds
+        self.aggregates = list(aggregates)
+        self._reset()
+
+    def __str__(self):
+        if self.steps is None and self.seconds is None:
+            return "every point"
+        windows = ["{} steps".format(self.steps)] if self.steps is not None else []
+        if self.seconds is not None:
+            windows.append("{}s".format(self.seconds))
+        return "{} per {}".format("/".join(self.aggregates), " or ".join(windows))
+
+    @property
+    def aggregating(self):
+        return self.steps is not None or self.seconds is not None
+
+    def _reset(self):
+        self._count = 0
+        self._sum = 0.0
+        self._min = math.inf
+        self._max = -math.inf
+        self._last = None
+        self._step = None
+        self._start = None
+        self._timestamp = None
+
+    def _window(self):
+        values = {"mean": self._sum / self._count, "min": self._min, "max": self._max, "last": self._last,
+                  "count": float(self._count)}
+        window = {"step": self._step, "timestamp": self._timestamp,
+                  "values": {a: values[a] for a in self.aggregates}}
+        self._reset()
+        return window
+
+    def add(self, steps, values, timestamps):
+        """
+        Adds points to the open window.
+        :param steps: Steps of the points
+        :param values: Values of the points
+        :param timestamps: Timestamps of the points in milliseconds
+        :return: List of the windows closed by the points. A window is a dict of the step and timestamp of its last
+        point and its aggregated values.
+        """
+        closed = []
+        for step, value, timestamp in zip(steps, values, timestamps):
+            if self._count > 0 and self.seconds is not None and timestamp - self._start >= self.seconds * 1000:
+                closed.append(self._window())
+            if self._count == 0:
+                self._start = timestamp
+            value = float(value)
+            self._count += 1
+            self._sum += value
+            self._min = min(self._min, value)
+            self._max = max(self._max, value)
+            self._last = value
+            self._step = step
+            self._timestamp = timestamp
+            if self.steps is None and self.seconds is None or self.steps is not None and self._count >= self.steps:
+                closed.append(self._window())
+        return closed
+
+    def close(self):
+        """
+        Closes the open window.
+        :return: The window or None if it holds no points
+        """
+        if self._count == 0:
+            return None
+        return self._window()
+
+
+class MetricPointFile:
+    """
+    Append-only file holding every point of a metric exactly as fixed size binary records of step, value and
+    timestamp. Points are appended in blocks, nothing is kept in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.number_of_points = 0
+
+    def append(self, steps, values, timestamps):
+        records = np.empty(len(steps), dtype=POINT_DTYPE)
+        records["step"] = steps
+        records["value"] = values
+        records["timestamp"] = timestamps
+        if self.number_of_points == 0:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            records.tofile(f)
+        self.number_of_points += len(records)
+
+
+def read_points(path):
+    """
+    Reads the points of a metric point file.
+    :param path: Path to the file
+    :return: Structured numpy array with the fields step, value and timestamp
+    """
+    return np.fromfile(path, dtype=POINT_DTYPE)
@@ -0,0 +1,132 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from pypads import logger
+
+# Arrays attached to the shared memory of the parent process. Only set in worker processes.
+_worker_arrays = {}
+
+
+def _share(array):
+    """
+    Copies an array once into a shared memory block.
+    :param array: Array to share. Object arrays can't be shared and are passed on by pickling instead.
+    :return: Tuple of the shared memory block (or None) and a descriptor to attach to it in a worker.
+    """
+    from multiprocessing import shared_memory
+    if array is None:
+        return None, None
+    array = np.asarray(array)
+    if array.dtype.hasobject:
+        return None, ("pickled", array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, ("shared", shm.name, array.shape, array.dtype.str)
+
+
+def _attach(descriptor):
+    """
+    Attaches to a shared array without copying it.
+    :param descriptor: Descriptor produced by _share.
+    :return: Tuple of the shared memory block (or None) and the array view.
+    """
+    if descriptor is None:
+        return None, None
+    if descriptor[0] == "pickled":
+        return None, descriptor[1]
+    from multiprocessing import shared_memory
+    _, name, shape, dtype = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    view.flags.writeable = False
+    return shm, view
+
+
+def _init_worker(x_descriptor, y_descriptor):
+    _worker_arrays["X"] = _attach(x_descriptor)
+    _worker_arrays["y"] = _attach(y_descriptor)
+
+
+def _run_fold(fn, train, test, val):
+    _, X = _worker_arrays["X"]
+    _, y = _worker_arrays["y"]
+    return fn(X, y, train, test, val)
+
+
+class SharedArrays:
+    """
+    Context manager copying arrays once into shared memory. The shared memory blocks are always unlinked when the
+    context is left, also if the folds weren't consumed completely or an exception was raised.
+    """
+
+    def __init__(self, *arrays):
+        self.arrays = arrays
+        self.descriptors = None
+        self._blocks = []
+
+    @property
+    def available(self):
+        try:
+            from multiprocessing import shared_memory
+            return True
+        except ImportError:
+            return False
+
+    def __enter__(self):
+        if not self.available:
+            logger.warning("Shared memory is not available in this python version. Executing folds sequentially.")
+            return self
+        try:
+            descriptors = []
+            for array in self.arrays:
+                shm, descriptor = _share(array)
+                self._blocks.append(shm)
+                descriptors.append(descriptor)
+            self.descriptors = tuple(descriptors)
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Closes and unlinks the shared memory blocks.
+        """
+        blocks, self._blocks, self.descriptors = self._blocks, [], None
+        for shm in blocks:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+
+def execute_folds(fn, shared, folds, n_jobs=None):
+    """
+    Executes a fold function for each of the given folds in a process pool. Every worker gets read only views on the
+    shared X and y. Workers are spawned to run untracked.
+    :param fn: Picklable function fn(X, y, train_idx, test_idx, val_idx) executed for every fold.
+    :param shared: Entered SharedArrays of X and y. Their shared memory is released by leaving its context.
+    :param folds: List of (train_idx, test_idx, val_idx) tuples
+    :param n_jobs: Number of worker processes. Defaults to the number of cpus.
+    :return: Generator over the results of the folds in the order of the folds.
+    """
+    if shared.descriptors is None:
+        X, y = shared.arrays
+        for train, test, val in folds:
+            yield fn(X, y, train, test, val)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs or multiprocessing.cpu_count(),
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=shared.descriptors) as executor:
+        futures = [executor.submit(_run_fold, fn, train, test, val) for train, test, val in folds]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,193 @@
+import numpy as np
+from pypads import logger
+
+from pypads_padre.concepts.decisions import take, concatenate, rows, is_sparse, mismatches
+
+SAMPLING_POLICIES = ["all", "rate", "reservoir", "stratified", "errors"]
+
+
+def _dense(values):
+    return values.toarray() if is_sparse(values) else values
+
+
+def _quotas(counts, size):
+    """
+    Splits a sample size into quotas of classes proportional to their counts. Every class gets at least one row as long
+    as the size allows it, no class more rows than it has. The quotas sum up to the size.
+    :param counts: Number of rows of each class
+    :param size: Size of the sample
+    :return: numpy array of the quotas
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    size = min(int(size), int(counts.sum()))
+    quotas = np.zeros(len(counts), dtype=np.int64)
+    if size < len(counts):
+        # Not every class fits into the sample. Keep one row of each of the largest classes.
+        quotas[np.argsort(-counts, kind="stable")[:size]] = 1
+        return quotas
+    quotas[:] = 1
+    remaining = size - len(counts)
+    capacity = counts - quotas
+    if remaining == 0:
+        return quotas
+    # Largest remainder method on the rows left in each class
+    shares = remaining * capacity / capacity.sum()
+    quotas += np.floor(shares).astype(np.int64)
+    left = size - int(quotas.sum())
+    quotas[np.argsort(-(shares - np.floor(shares)), kind="stable")[:left]] += 1
+    return quotas
+
+
+class _Reservoir:
+    """
+    Uniform sample of at most size rows out of a stream of decision columns (Algorithm R, vectorized per chunk).
+    """
+
+    def __init__(self, size, random):
+        self.size = size
+        self.seen = 0
+        self.columns = None
+        self._random = random
+
+    def add(self, columns):
+        n = rows(columns)
+        if n == 0:
+            return
+        if self.columns is None:
+            # Sparse columns are held densely, the reservoir has a bounded size
+            self.columns = {key: np.empty((self.size,) + column.shape[1:],
+                                          dtype=object if column.dtype.kind in "US" else column.dtype)
+                            for key, column in columns.items()}
+        free = max(0, min(n, self.size - self.seen))
+        for key, column in columns.items():
+            self.columns[key][self.seen:self.seen + free] = _dense(column[:free])
+        if free < n:
+            # Row i of the stream replaces a random slot with the probability size / (i + 1)
+            index = self.seen + np.arange(free, n)
+            slots = (self._random.random_sample(n - free) * (index + 1)).astype(np.int64)
+            keep = slots < self.size
+            for key, column in columns.items():
+                self.columns[key][slots[keep]] = _dense(column[free:][keep])
+        self.seen += n
+
+    def rows(self):
+        if self.columns is None:
+            return {}
+        return take(self.columns, slice(0, min(self.seen, self.size)))
+
+
+class DecisionSampler:
+    """
+    Selects the decisions of a split to be stored. The summary of the decisions is always computed on all of them.
+    Decisions are offered chunk wise. Memory is bounded by the size of the reservoirs.
+
+    Policies:
+    - all: keep every decision
+    - rate: keep each decision with the probability rate
+    - reservoir: keep a uniform sample of at most size decisions
+    - stratified: keep the same share (rate or size / number of decisions) of every predicted class, at least one each.
+      With a size exactly size decisions are kept (or all if there are less).
+    - errors: keep all wrong decisions plus a sample of the correct ones given by rate or size
+    """
+
+    def __init__(self, policy="all", rate=None, size=None, seed=None):
+        if policy not in SAMPLING_POLICIES:
+            raise ValueError("Unknown sampling policy {}. Use one of {}.".format(policy, SAMPLING_POLICIES))
+        if policy != "all" and rate is None and size is None:
+            raise ValueError("Sampling policy {} needs a rate or a size.".format(policy))
+        self.policy = policy
+        self.rate = rate
+        self.size = size
+        self._random = np.random.RandomState(seed)
+        self._reservoirs = {}
+        self._class_counts = {}
+        self._sampled_classes = set()
+
+    def __str__(self):
+        return self.policy + ("" if self.rate is None else "(rate={})".format(self.rate)) + (
+            "" if self.size is None else "(size={})".format(self.size))
+
+    def _sample(self, columns, key=None):
+        """
+        Samples uniformly by rate. If a size is given the sample is held back in a reservoir until drained.
+        """
+        if self.rate is not None:
+            columns = take(columns, self._random.random_sample(rows(columns)) < self.rate)
+        if self.size is None:
+            return columns
+        if key not in self._reservoirs:
+            self._reservoirs[key] = _Reservoir(self.size, self._random)
+        self._reservoirs[key].add(columns)
+        return {}
+
+    def offer(self, columns, predictions, truth=None):
+        """
+        Offers a chunk of decisions to the sampler.
+        :param columns: Decision columns of the chunk
+        :param predictions: Predictions of the chunk
+        :param truth: Truth values of the chunk if known
+        :return: Decision columns to store right away. Others might be returned by drain.
+        """
+        if self.policy == "all" or rows(columns) == 0:
+            return columns
+
+        if self.policy == "stratified":
+            if predictions.ndim > 1:
+                logger.warning("Can't stratify multi dimensional predictions. Sampling uniformly instead.")
+                return self._sample(columns)
+            classes, inverse, counts = np.unique(predictions, return_inverse=True, return_counts=True)
+            selected = []
+            for i, (c, count) in enumerate(zip(classes, counts)):
+                class_columns = take(columns, inverse == i)
+                if self.size is not None:
+                    self._class_counts[c] = self._class_counts.get(c, 0) + int(count)
+                    if c not in self._reservoirs:
+                        self._reservoirs[c] = _Reservoir(self.size, self._random)
+                    self._reservoirs[c].add(class_columns)
+                else:
+                    k = int(round(count * self.rate))
+                    if k == 0 and c not in self._sampled_classes:
+                        k = 1
+                    if k > 0:
+                        self._sampled_classes.add(c)
+                    selected.append(take(class_columns, np.sort(self._random.choice(count, k, replace=False))))
+            return concatenate(selected)
+
+        if self.policy == "errors":
+            if truth is None:
+                logger.warning("Can't keep all errors without truth values. Sampling uniformly instead.")
+                return self._sample(columns)
+            wrong = mismatches(predictions, truth)
+            sampled = self._sample(take(columns, ~wrong), key="correct")
+            return concatenate([part for part in [take(columns, wrong), sampled] if rows(part) > 0])
+
+        return self._sample(columns)
+
+    @property
+    def held(self):
+        """
+        :return: Number of decisions held back in the reservoirs, which drain will return
+        """
+        if self.policy == "stratified" and self.size is not None:
+            return int(_quotas([self._class_counts[c] for c in self._reservoirs.keys()], self.size).sum())
+        return sum(min(reservoir.seen, reservoir.size) for reservoir in self._reservoirs.values())
+
+    def drain(self):
+        """
+        Empties the reservoirs.
+        :return: Decision columns held back in the reservoirs
+        """
+        parts = []
+        if self.policy == "stratified" and self.size is not None:
+            classes = list(self._reservoirs.keys())
+            quotas = _quotas([self._class_counts[c] for c in classes], self.size)
+            for c, k in zip(classes, quotas):
+                sample = self._reservoirs[c].rows()
+                # A reservoir holds min(size, count) rows, which is at least the quota of its class
+                parts.append(take(sample, np.sort(self._random.choice(rows(sample), int(k), replace=False))))
+        else:
+            parts = [reservoir.rows() for reservoir in self._reservoirs.values()]
+        self._reservoirs = {}
+        self._class_counts = {}
+        self._sampled_classes = set()
+        return concatenate([part for part in parts if rows(part) > 0])
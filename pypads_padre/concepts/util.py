@@ -26,6 +26,26 @@ def persistent_hash(to_hash, algorithm=hashlib.md5):
     return int(algorithm(to_hash.encode("utf-8")).hexdigest(), 16)
 
 
+def index_hash(*index_sets, algorithm=hashlib.md5):
+    """
+    Content hash of a sequence of index sets. Index sets are hashed on their int64 byte representation, such that
+    equal splits share the same hash regardless of being given as lists or arrays of any integer type.
+    :param index_sets: Index arrays / lists. None is hashed as an empty set.
+    :param algorithm: Hashing algorithm to use.
+    :return: Hex digest of the index sets.
+    """
+    h = algorithm()
+    for idx in index_sets:
+        if idx is None:
+            idx = []
+        try:
+            h.update(np.ascontiguousarray(idx, dtype=np.int64).tobytes())
+        except (TypeError, ValueError):
+            h.update(str(idx).encode("utf-8"))
+        h.update(b"|")
+    return h.hexdigest()
+
+
 def get_by_tag(tag=None, value=None, experiment_id=None):
     from pypads.app.pypads import get_current_pads
     pads = get_current_pads()
@@ -1,12 +1,136 @@
-from typing import Type, Union
+import os
+import uuid
+from typing import Type, Union, List
 
 from pydantic import BaseModel
+from pypads import logger
 from pypads.app.env import InjectionLoggerEnv
 from pypads.app.injections.injection import MultiInjectionLogger
 from pypads.app.injections.tracked_object import TrackedObject, LoggerOutput
 from pypads.model.logger_output import OutputModel, TrackedObjectModel
 from pypads.model.models import IdReference
 
+from pypads_padre.util import TMP_TEARDOWN_ORDER
+
+# Statistics computed for the weights and gradients of every parameter tensor
+MODEL_STATISTICS = ["norm", "mean", "std", "min", "max"]
+
+
+class _ModelWatcher:
+    """
+    Hooks into a torch model to sample statistics of its weights and gradients every sample_every training steps. The
+    statistics are reduced on the device of the model into preallocated buffers, no values are copied to the host
+    until the buffers are flushed. Steps which are not sampled only cost a flag check per hook.
+    """
+
+    def __init__(self, model, to, sample_every=100, histogram_bins=16, capacity=64):
+        import torch
+        self.to = to
+        self.sample_every = max(1, sample_every)
+        self.histogram_bins = histogram_bins
+        self.capacity = capacity
+        self.names = [name for name, _ in model.named_parameters()]
+        self.parameters = [p for _, p in model.named_parameters()]
+
+        device = self.parameters[0].device if len(self.parameters) > 0 else None
+        shape = (capacity, len(self.parameters))
+        self.weights = torch.zeros(shape + (len(MODEL_STATISTICS),), device=device)
+        self.gradients = torch.zeros(shape + (len(MODEL_STATISTICS),), device=device)
+        self.weight_histograms = torch.zeros(shape + (histogram_bins,), device=device) if histogram_bins else None
+        self.gradient_histograms = torch.zeros(shape + (histogram_bins,), device=device) if histogram_bins else None
+
+        self.step = 0
+        self.steps = []
+        self.epoch = 0
+        self.sampling = False
+        self.training = False
+
+        self.handles = [model.register_forward_pre_hook(self._forward)]
+        for i, p in enumerate(self.parameters):
+            if p.requires_grad:
+                self.handles.append(p.register_hook(self._gradient_hook(i)))
+
+    def _reduce(self, x, statistics, histograms, row, i):
+        import torch
+        with torch.no_grad():
+            x = x.detach().float().reshape(-1)
+            if x.numel() == 0:
+                return
+            std, mean = torch.std_mean(x) if x.numel() > 1 else (torch.zeros_like(x[0]), x[0])
+            values = statistics[row, i]
+            values[0] = x.norm()
+            values[1] = mean
+            values[2] = std
+            values[3] = x.min()
+            values[4] = x.max()
+            if histograms is not None:
+                # The bins span min to max of the tensor
+                histograms[row, i] = torch.histc(x, bins=self.histogram_bins)
+
+    def _forward(self, module, inputs):
+        if not module.training:
+            # Evaluating after training ends the epoch
+            if self.training:
+                self.training = False
+                self.flush()
+            self.sampling = False
+            return
+        self.training = True
+        self.step += 1
+        self.sampling = self.step % self.sample_every == 0
+        if self.sampling:
+            if len(self.steps) >= self.capacity:
+                self.flush(complete=False)
+            self.steps.append(self.step)
+            row = len(self.steps) - 1
+            for i, p in enumerate(self.parameters):
+                self._reduce(p, self.weights, self.weight_histograms, row, i)
+
+    def _gradient_hook(self, i):
+        def hook(grad):
+            if self.sampling:
+                self._reduce(grad, self.gradients, self.gradient_histograms, len(self.steps) - 1, i)
+
+        return hook
+
+    def flush(self, complete=True):
+        """
+        Stores the sampled statistics as a compressed array artifact.
+        :param complete: The epoch is complete. Otherwise only the buffers were full.
+        """
+        if len(self.steps) == 0:
+            return
+        import numpy as np
+        from pypads.utils.logging_util import get_temp_folder
+        rows = len(self.steps)
+        arrays = {"parameters": np.array(self.names), "statistics": np.array(MODEL_STATISTICS),
+                  "steps": np.array(self.steps, dtype=np.int64),
+                  "weights": self.weights[:rows].cpu().numpy(), "gradients": self.gradients[:rows].cpu().numpy()}
+        if self.weight_histograms is not None:
+            arrays["weight_histograms"] = self.weight_histograms[:rows].cpu().numpy()
+            arrays["gradient_histograms"] = self.gradient_histograms[:rows].cpu().numpy()
+        os.makedirs(get_temp_folder(), exist_ok=True)
+        path = os.path.join(get_temp_folder(), "model_statistics_{}_{}.npz".format(self.epoch, uuid.uuid4()))
+        np.savez_compressed(path, **arrays)
+        try:
+            self.to.statistics_artifacts.append(self.to.store_artifact(
+                path, None, description="Weight and gradient statistics of epoch {}".format(self.epoch)))
+        finally:
+            os.remove(path)
+        self.to.number_of_samples += rows
+        self.steps = []
+        self.gradients.zero_()
+        if self.gradient_histograms is not None:
+            self.gradient_histograms.zero_()
+        if complete:
+            self.epoch += 1
+
+    def close(self):
+        for handle in self.handles:
+            handle.remove()
+        self.handles = []
+        self.flush()
+
 
 class ModelTO(TrackedObject):
     """
@@ -17,20 +141,67 @@ class ModelTO(TrackedObject):
         type: str = "TorchModel"
         description = "Information on the pytorch model used."
         Model: str = ...
+        parameter_names: List[str] = []  # Names of the parameter tensors of the model
+        sample_every: int = None  # Number of training steps between two samples of the statistics
+        statistic_names: List[str] = MODEL_STATISTICS  # Statistics computed for each parameter tensor
+        histogram_bins: int = None  # Number of histogram bins of each parameter tensor
+        number_of_samples: int = 0
+        statistics_artifacts: List[str] = []  # References to the npz artifacts holding the statistics of each epoch
 
     def __init__(self, *args, parent: Union[OutputModel, 'TrackedObject'], **kwargs):
         super().__init__(*args, parent=parent, **kwargs)
+        self._watcher = None
 
     @classmethod
     def get_model_cls(cls) -> Type[BaseModel]:
         return cls.TorchModel
 
+    def watch(self, model, sample_every=100, histogram_bins=16, capacity=64):
+        self._watcher = _ModelWatcher(model, self, sample_every=sample_every, histogram_bins=histogram_bins,
+                                      capacity=capacity)
+        self.parameter_names = self._watcher.names
+        self.sample_every = self._watcher.sample_every
+        self.histogram_bins = histogram_bins
+
+    def unwatch(self):
+        """
+        Removes the hooks from the model and stores the remaining statistics.
+        """
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+
+    def store(self):
+        self.unwatch()
+        return super().store()
+
+
+def _unwatch_models(pads, *args, **kwargs):
+    for to in (pads.cache.run_pop("watched_models", default=None) or {}).values():
+        to.unwatch()
+
+
+def _outermost_init(call_stack, instance):
+    """
+    Checks if the current call on the call stack is the outermost tracked initialization of the instance. The
+    initializations of its super classes are nested in it.
+    """
+    return not any(call.call_id.instance_id == id(instance) and call.call_id.wrappee.__name__ == "__init__"
+                   for call in call_stack[:-1])
+
 
 class TorchModelILF(MultiInjectionLogger):
     """
     Function logging everything we can about a pytorch model. This stores information on layers, weights, gradients, etc.
 
+        Hook:
+            Hook this logger to the initialization of the model (e.g. with the watch decorator and track="model").
 
+    Every sample_every training steps (hook parameter, a step is a forward pass in training mode) the norm, mean, std,
+    min, max and a histogram (histogram_bins, 0 to disable) of the weights and gradients of every parameter tensor are
+    computed on the device of the model. The samples of an epoch are stored as a single npz artifact when the model
+    is evaluated after training, when capacity samples were taken or when the run ends. The first model initialized in
+    a run is watched once its outermost tracked __init__ returned, such that the layers of subclasses exist.
     """
 
     name = "Torch Model Logger"
@@ -44,29 +215,37 @@ class TorchModelILF(MultiInjectionLogger):
         tracked object doesn't give a lot of benefit but enforcing a description a name and a category and could be omitted.
         """
         type: str = "TorchModelILF-Output"
-        model_to: IdReference = ...
+        model_to: IdReference = None
 
     @staticmethod
     def finalize_output(pads, logger_call, output, *args, **kwargs):
-        pass
+        if output.model_to is not None:
+            output.model_to = output.model_to.store()
+        logger_call.output = output.store()
 
     @classmethod
     def output_schema_class(cls) -> Type[OutputModel]:
         return cls.TorchModelILFOutput
 
     def __post__(self, ctx, *args, _pypads_env: InjectionLoggerEnv, _logger_call,
-                 _logger_output: Union['TorchModelILFOutput', LoggerOutput], _args, _kwargs, **kwargs):
+                 _logger_output: Union['TorchModelILFOutput', LoggerOutput], _args, _kwargs, sample_every=100,
+                 histogram_bins=16, capacity=64, **kwargs):
         """
-        Function logging information about the logger
+        Function registering the hooks sampling the weights and gradients of the model.
+        :param sample_every: Number of training steps between two samples
+        :param histogram_bins: Number of histogram bins per parameter tensor
+        :param capacity: Number of samples buffered on the device before they are stored
         """
-
-        mapping_data = _pypads_env.data
-
-        # Todo registering hooks and extracting information on the torch model.
-        def gradient_hook():
-            pass
-
-        def weights_hook():
-            pass
-
-        pass
+        # Initializations of super classes of the model are hooked too
+        pads = _pypads_env.pypads
+        if _logger_output.model_to is not None or not _outermost_init(pads.call_tracker.call_stack, ctx):
+            return
+        try:
+            to = ModelTO(Model=ctx.__class__.__name__, parent=_logger_output)
+            to.watch(ctx, sample_every=sample_every, histogram_bins=histogram_bins, capacity=capacity)
+            _logger_output.model_to = to
+            # The remaining statistics are stored before the temporary folder of the run is removed
+            pads.cache.run_add("watched_models", {id(to): to})
+            pads.api.register_teardown_utility("watched_models_unwatch", _unwatch_models, order=TMP_TEARDOWN_ORDER)
+        except Exception as e:
+            logger.warning("Couldn't watch the weights and gradients of {} because {}".format(ctx.__class__, str(e)))
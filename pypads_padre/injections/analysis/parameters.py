@@ -1,3 +1,5 @@
+import functools
+import weakref
 from typing import Union, Iterable
 
 from pypads import logger
@@ -7,47 +9,72 @@ from pypads.injections.analysis.parameters import ParametersILF, FunctionParamet
 from pypads.utils.logging_util import data_str, data_path, add_data
 
 
-def _get_relevant_parameters(model):
-    import torch
+@functools.lru_cache(maxsize=None)
+def _init_parameters(cls):
+    """
+    Names of the parameters of the constructor of a module class. The signature is inspected once per class.
+    """
     import inspect
-    layers = dict()
-    n = 0
+    try:
+        return tuple(inspect.signature(cls.__init__).parameters.keys())
+    except (TypeError, ValueError):
+        return ()
+
+
+def _layers(model):
+    import torch
+    return [m for i, m in enumerate(model.modules()) if i > 0 and not isinstance(m, torch.nn.Sequential)]
+
+
+def _signature(model):
+    """
+    Cheap signature of the parameters of a model. A cached summary is computed again if it changed.
+    """
+    return tuple((name, tuple(p.shape), p.requires_grad) for name, p in model.named_parameters())
+
+
+# Parameter summaries of the tracked models with the signature they were computed for
+_summaries = weakref.WeakKeyDictionary()
+
+
+def _summarize(model, layers):
+    summary = dict()
     total_params = 0
     trainable_params = 0
-    for i, m in enumerate(model.modules()):
-        if i == 0:
-            continue
-        else:
-            if isinstance(m, torch.nn.Sequential):
-                continue
-            else:
-                n += 1
-                trainable = False
-                params = 0
-                signature = inspect.signature(m.__init__)
-                keys = [k for k in signature.parameters.keys()]
-                # extracting information from the layer
-                for k in keys:
-                    if k in m.__dict__:
-                        p = m.__dict__.get(k)
-                        if isinstance(p, Iterable):
-                            p = str(p)
-                        layers["{}.{}".format(m.__class__.__name__, k)] = p
-                if hasattr(m, "weight") and hasattr(m.weight, "size"):
-                    params += torch.prod(torch.LongTensor(list(m.weight.size()))).item()
-                    trainable = m.weight.requires_grad
-                if hasattr(m, "bias") and hasattr(m.bias, "size"):
-                    params += torch.prod(torch.LongTensor(list(m.bias.size()))).item()
-                layers["{}.{}".format(m.__class__.__name__, "parameters")] = params
-                total_params += params
-                if trainable:
-                    trainable_params += params
-
-    layers["{}.Trainable_parameters".format(model.__class__.__name__)] = trainable_params
-    layers["{}.Total_parameters".format(model.__class__.__name__)] = total_params
-    layers["{}.Number_of_layers".format(model.__class__.__name__)] = n
-
-    return layers
+    for m in layers:
+        # extracting information from the layer
+        for k in _init_parameters(m.__class__):
+            if k in m.__dict__:
+                p = m.__dict__.get(k)
+                if isinstance(p, Iterable):
+                    p = str(p)
+                summary["{}.{}".format(m.__class__.__name__, k)] = p
+        params = 0
+        for _, p in m.named_parameters(recurse=False):
+            params += p.numel()
+            if p.requires_grad:
+                trainable_params += p.numel()
+        summary["{}.{}".format(m.__class__.__name__, "parameters")] = params
+        total_params += params
+
+    summary["{}.Trainable_parameters".format(model.__class__.__name__)] = trainable_params
+    summary["{}.Total_parameters".format(model.__class__.__name__)] = total_params
+    summary["{}.Number_of_layers".format(model.__class__.__name__)] = len(layers)
+    return summary
+
+
+def _get_relevant_parameters(model):
+    """
+    Summary of the layers of a torch model holding their constructor arguments and parameter counts. Every direct
+    parameter of a layer is counted (e.g. also the weights of recurrent layers), trainable parameters are counted per
+    parameter. The summary is computed once per model as long as the signature of its parameters doesn't change.
+    """
+    signature = _signature(model)
+    cached = _summaries.get(model)
+    if cached is None or cached[0] != signature:
+        cached = (signature, _summarize(model, _layers(model)))
+        _summaries[model] = cached
+    return dict(cached[1])
 
 
 # noinspection PyMethodMayBeStatic, DuplicatedCode
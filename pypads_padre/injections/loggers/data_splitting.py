@@ -10,11 +10,13 @@ from pypads.app.injections.injection import OriginalExecutor, MultiInjectionLogg
 from pypads.importext.mappings import LibSelector
 from pypads.importext.versioning import all_libs
 from pypads.model.logger_output import TrackedObjectModel, OutputModel
-from pypads.model.models import IdReference
+from pypads.model.models import IdReference, BaseStorageModel, ResultType
+from pypads.utils.logging_util import FileFormats
 # from pypads_onto.arguments import ontology_uri
 # from pypads_onto.model.ontology import EmbeddedOntologyModel
 
-from pypads_padre.concepts.util import _tolist
+from pypads_padre.concepts.hashing import split_duplicates, dataset_row_hashes, dataset_instance_ids
+from pypads_padre.concepts.util import _tolist, index_hash, persistent_hash
 
 ontology_uri = "https://www.padre-lab.eu/onto/"
 
@@ -49,6 +51,94 @@ def splitter_output(result, fn):
         return None, None, None
 
 
+class CapturedBatches:
+    """
+    Iterator over the batches of a captured DataLoader epoch. The indices are held as a single int64 array and the
+    batches are sliced out of it when drawn.
+    """
+
+    def __init__(self, indices, offsets, single_indices=False):
+        self.indices = indices
+        self.offsets = offsets
+        self.single_indices = single_indices
+        self._batch = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._batch >= len(self.offsets):
+            raise StopIteration
+        start = int(self.offsets[self._batch - 1]) if self._batch > 0 else 0
+        stop = int(self.offsets[self._batch])
+        self._batch += 1
+        if self.single_indices:
+            return int(self.indices[start])
+        return self.indices[start:stop].tolist()
+
+
+def _resets_on_init(loader_iter):
+    """
+    Checks if the iterator recreates its sampler iterator in a _reset at the end of its __init__ (multiprocessing
+    iterators of newer torch versions). The order is then captured by the hooked _reset.
+    """
+    from torch.utils.data.dataloader import _BaseDataLoaderIter
+    for klass in type(loader_iter).__mro__:
+        if klass is _BaseDataLoaderIter:
+            return False
+        if "_reset" in vars(klass):
+            return True
+    return False
+
+
+def sampler_output(loader_iter):
+    """
+    Captures the index order of a torch DataLoader epoch in bulk. The batch sampler iterator of the epoch is drawn once
+    into a single int64 array and replaced by an iterator over the captured batches. The epoch therefore uses exactly
+    the captured order. This has to happen before any index is drawn, i.e. after the sampler iterator was created by
+    __init__ or _reset and before a multiprocessing iterator prefetches its first batches.
+    :param loader_iter: A torch _BaseDataLoaderIter after its initialization or reset.
+    :return: Tuple of the concatenated indices of the epoch and the end offsets of the single batches. (None, None) if
+    the loader doesn't use a sampler or the epoch was already captured.
+    """
+    import numpy as np
+    from torch.utils.data import IterableDataset
+    sampler_iter = getattr(loader_iter, "_sampler_iter", None)
+    if sampler_iter is None or isinstance(sampler_iter, CapturedBatches) or isinstance(
+            getattr(loader_iter, "_dataset", None), IterableDataset):
+        return None, None
+
+    parts = []
+    lengths = []
+    single_indices = False
+    for batch in sampler_iter:
+        # Without auto collation the sampler yields single indices instead of batches
+        if not hasattr(batch, "__len__"):
+            single_indices = True
+            batch = (batch,)
+        parts.append(np.asarray(batch, dtype=np.int64))
+        lengths.append(len(parts[-1]))
+    indices = np.concatenate(parts) if len(parts) > 0 else np.empty(0, dtype=np.int64)
+    offsets = np.cumsum(np.asarray(lengths, dtype=np.int64))
+    loader_iter._sampler_iter = CapturedBatches(indices, offsets, single_indices=single_indices)
+    return indices, offsets
+
+
+class SplitRepositoryObject(BaseStorageModel):
+    """
+    Class to be used in the repository holding the index sets of a split. Repositories are supposed to store objects
+    used over multiple runs.
+    """
+    name: str = "Split"
+    category: str = "SplitRepositoryEntry"
+    dataset_reference: str = None  # Fingerprint of the dataset the indices are pointing into
+    train_size: int = 0
+    test_size: int = 0
+    validation_size: int = 0
+    binary_references: Union[str, List[str]] = ...  # Reference to the index sets binary
+    storage_type: Union[str, ResultType] = "split"
+
+
 class SplitTO(TrackedObject):
     """
     Tracking Object class for splits of your tracked dataset. Splits are defined
@@ -78,6 +168,12 @@ class SplitTO(TrackedObject):
             train_set: List = []
             test_set: List = []
             validation_set: List = []
+            repository_reference: str = None  # reference to the index sets in the split repository
+            batch_offsets: List = []  # end offsets of the batches if the split was consumed in batches
+            test_train_duplicates: int = None  # test instances also contained in the training set
+            validation_train_duplicates: int = None  # validation instances also contained in the training set
+            test_validation_duplicates: int = None  # test instances also contained in the validation set
+            duplicate_instances: int = None  # exact duplicates over all instances of the split
 
             class Config:
                 orm_mode = True
@@ -96,7 +192,10 @@ class SplitTO(TrackedObject):
     def __init__(self, *args, parent, **kwargs):
         super().__init__(*args, parent=parent, **kwargs)
 
-    def add_split(self, split_id=uuid.uuid4(), train_set=None, test_set=None, val_set=None):
+    def add_split(self, split_id=None, train_set=None, test_set=None, val_set=None, repository_reference=None,
+                  batch_offsets=None, duplicates=None):
+        if split_id is None:
+            split_id = uuid.uuid4()
         if val_set is None:
             val_set = []
         if test_set is None:
@@ -104,9 +203,77 @@ class SplitTO(TrackedObject):
         if train_set is None:
             train_set = []
         split = self.SplitModel.Split(train_set=_tolist(train_set), test_set=_tolist(test_set),
-                                      validation_set=_tolist(val_set))
+                                      validation_set=_tolist(val_set), repository_reference=repository_reference,
+                                      batch_offsets=_tolist(batch_offsets) or [])
+        if duplicates is not None:
+            split.test_train_duplicates = duplicates.get("test_in_train")
+            split.validation_train_duplicates = duplicates.get("validation_in_train")
+            split.test_validation_duplicates = duplicates.get("test_in_validation")
+            split.duplicate_instances = duplicates.get("duplicates")
         self.splits.update({str(split_id): split})
 
+    def track_split(self, train_set=None, test_set=None, val_set=None, batch_offsets=None):
+        """
+        Adds a split and stores its index sets into the split repository if they are not already known. Splits are
+        identified by the fingerprint of the tracked dataset and the content of their index sets.
+        :param batch_offsets: Optional end offsets of the batches in which the split is consumed.
+        :return: Id of the split
+        """
+        import numpy as np
+        from pypads.app.pypads import get_current_pads
+        pads = get_current_pads()
+
+        dataset_hash = pads.cache.run_get("dataset_hash") if pads.cache.run_exists("dataset_hash") else None
+        split_id = str(persistent_hash((str(dataset_hash), index_hash(train_set, test_set, val_set))))
+
+        # Join the row hashes of the index sets to find leaking and duplicate instances
+        duplicates = None
+        hashes = dataset_row_hashes(pads)
+        if hashes is not None:
+            try:
+                duplicates = split_duplicates(hashes, train_set, test_set, val_set)
+                if duplicates["test_in_train"] > 0 or duplicates["validation_in_train"] > 0 \
+                        or duplicates["test_in_validation"] > 0:
+                    logger.warning("Split {} is leaking: {} test and {} validation instances are also contained in "
+                                   "the training set, {} test instances in the validation set."
+                                   .format(split_id, duplicates["test_in_train"], duplicates["validation_in_train"],
+                                           duplicates["test_in_validation"]))
+            except IndexError:
+                logger.warning("Indices of split {} don't point into the tracked dataset. "
+                               "Skipping duplicate detection.".format(split_id))
+
+        # Add to repo if needed
+        if not pads.split_repository.has_object(uid=split_id):
+            repo_obj = pads.split_repository.get_object(uid=split_id)
+            split_indices = {"train": train_set, "test": test_set, "validation": val_set}
+
+            # Reference the instances by their ids to allow for joins independent of the position in the dataset
+            ids = dataset_instance_ids(pads)
+            if ids is not None:
+                try:
+                    for key, idx in list(split_indices.items()):
+                        split_indices[key + "_ids"] = ids[np.asarray(idx, dtype=np.int64)] if idx is not None \
+                            else None
+                except IndexError:
+                    logger.warning("Indices of split {} don't point into the tracked dataset. "
+                                   "Skipping instance ids.".format(split_id))
+            binary_ref = repo_obj.log_mem_artifact("split_indices", split_indices,
+                                                   write_format=FileFormats.pickle,
+                                                   description="Index sets of the split", holder=self)
+            sro = SplitRepositoryObject(uid=split_id,
+                                        dataset_reference=str(dataset_hash) if dataset_hash is not None else None,
+                                        train_size=len(train_set) if train_set is not None else 0,
+                                        test_size=len(test_set) if test_set is not None else 0,
+                                        validation_size=len(val_set) if val_set is not None else 0,
+                                        binary_references=binary_ref)
+            repo_obj.log_json(sro)
+
+        pads.cache.run_add("current_split", split_id)
+        pads.cache.run_add("split_tracker", self)
+        self.add_split(split_id, train_set, test_set, val_set, repository_reference=split_id,
+                       batch_offsets=batch_offsets, duplicates=duplicates)
+        return split_id
+
 
 class SplitsOutput(OutputModel):
     """
@@ -164,10 +331,8 @@ class SplitILF(MultiInjectionLogger):
                 else:
                     splits = _logger_output.splits
                 for r in items:
-                    split_id = uuid.uuid4()
-                    pads.cache.run_add("current_split", split_id)
                     train, test, val = splitter_output(r, fn=_pypads_env.callback)
-                    splits.add_split(split_id, train, test, val)
+                    splits.track_split(train, test, val)
                     _logger_output.splits = splits
                     yield r
         else:
@@ -179,9 +344,7 @@ class SplitILF(MultiInjectionLogger):
                 else:
                     splits = _logger_output.splits
                 train, test, val = splitter_output(_return, fn=_pypads_env.callback)
-                split_id = uuid.uuid4()
-                pads.cache.run_add("current_split", split_id)
-                splits.add_split(split_id, train, test, val)
+                splits.track_split(train, test, val)
                 _logger_output.splits = splits
                 return _return
 
@@ -193,7 +356,12 @@ class SplitILFTorch(MultiInjectionLogger):
     Function logging splits used by torch DataLoader
 
         Hook:
-            Hook this logger to the splitting functionality of pytorch dataloader (e.g: DataLoader._next_index)
+            Hook this logger to the creation and the reset of the dataloader iterator (_BaseDataLoaderIter.__init__
+            and _BaseDataLoaderIter._reset). The index order of every epoch is then captured once in bulk before any
+            batch is drawn and tracked as a single split with the batch boundaries kept as offsets. This also covers
+            multiprocessing loaders prefetching batches and persistent workers resetting their iterator per epoch.
+            Hooking the per batch splitting functionality (e.g: _BaseDataLoaderIter._next_index) is still supported,
+            but tracks every single batch as a split.
     """
     name = "SplitTorch Logger"
     category = "TorchSplitLogger"
@@ -224,16 +392,27 @@ class SplitILFTorch(MultiInjectionLogger):
 
     def __post__(self, ctx, *args, _logger_call, _pypads_pre_return, _pypads_result, _logger_output, _args, _kwargs,
                  **kwargs):
-        from pypads.app.pypads import get_current_pads
-        pads = get_current_pads()
         if _logger_output.splits is None:
             splits = SplitTO(parent=_logger_output)
         else:
             splits = _logger_output.splits
         logger.info("Detected splitting, Tracking splits started...")
-        train, test, val = splitter_output(_pypads_result, fn=ctx)
-        split_id = uuid.uuid4()
-        pads.cache.run_add("current_split", split_id)
-        splits.add_split(split_id, train, test, val)
+        if _pypads_result is None and hasattr(ctx, "_sampler_iter"):
+            # A new epoch is started by creating or resetting the iterator. Capture its complete index order at once.
+            if _logger_call.last_call.call_id.wrappee.__name__ == "__init__" and _resets_on_init(ctx):
+                return
+            indices, offsets = sampler_output(ctx)
+            if indices is None:
+                return
+            train, test, val = splitter_output(indices, fn=ctx)
+            split_id = splits.track_split(train, test, val, batch_offsets=offsets)
+
+            # Keep the order of the epoch to map the rows of the model outputs to the dataset indices
+            from pypads.app.pypads import get_current_pads
+            get_current_pads().cache.run_add("epoch_order", {"split_id": split_id, "indices": indices,
+                                                             "offsets": offsets})
+        else:
+            train, test, val = splitter_output(_pypads_result, fn=ctx)
+            splits.track_split(train, test, val)
         # splits.store(_logger_output, "splits")
         _logger_output.splits = splits
@@ -13,7 +13,8 @@ from pypads.utils.logging_util import FileFormats, data_str
 # from pypads_onto.arguments import ontology_uri
 # from pypads_onto.model.ontology import EmbeddedOntologyModel
 
-from pypads_padre.concepts.dataset import Crawler
+from pypads_padre.concepts.dataset import Crawler, instance_ids
+from pypads_padre.concepts.hashing import row_hashes
 from pypads_padre.concepts.util import persistent_hash, validate_type
 
 ontology_uri = "https://www.padre-lab.eu/onto/"
@@ -29,6 +30,7 @@ class DatasetRepositoryObject(BaseStorageModel):
     description: str = ...
     documentation: str = ...
     binary_references: Union[str, List[str]] = ...  # Reference to the dataset binary
+    instance_ids_reference: str = None  # Reference to the binary of the instance ids
     location: str = ...  # Place where it is defined
     storage_type: Union[str, ResultType] = "dataset"
 
@@ -123,6 +125,7 @@ class DatasetTO(TrackedObject):
         repository_reference: str = ...  # reference to the dataset in the repository
         repository_type: str = ...  # type of the repository. Will always be extracted from the repository aka
         # 'pypads_datasets'
+        instance_key: str = None  # column holding the instance ids. Ids are content hashes of the rows if not given.
 
     @classmethod
     def get_model_cls(cls) -> Type[BaseModel]:
@@ -208,10 +211,33 @@ class DatasetILF(InjectionLogger):
         except Exception:
             logger.warning("Could not compute the hash of the dataset object, falling back to dataset name hash...")
             data_hash = persistent_hash((str(ds_name), str(metadata)))
+        pads.cache.run_add("dataset_hash", data_hash)
+
+        # Hash the rows of the dataset and build the position independent instance ids. Both are kept for the
+        # current run only. This allows for duplicate detection on splits.
+        ids = None
+        pads.cache.run_pop("dataset_row_hashes", default=None)
+        pads.cache.run_pop("dataset_instance_ids", default=None)
+        instance_key = pads.cache.run_get("dataset_instance_key") if pads.cache.run_exists(
+            "dataset_instance_key") else None
+        try:
+            hashes = row_hashes(data)
+            pads.cache.run_add("dataset_row_hashes", hashes)
+        except Exception as e:
+            hashes = None
+            logger.warning("Could not hash the rows of the dataset, duplicates in splits can't be detected: {}"
+                           .format(str(e)))
+        try:
+            ids = instance_ids(data, key=instance_key, hashes=hashes)
+            pads.cache.run_add("dataset_instance_ids", ids)
+        except Exception as e:
+            logger.warning("Could not extract instance ids of the dataset, instances can only be referenced by "
+                           "their position: {}".format(str(e)))
 
         # create referencing object
         dto = DatasetTO(parent=_logger_output, name=ds_name, shape=metadata.get("shape", None), metadata=metadata,
-                        repository_reference=data_hash, repository_type=_pypads_env.pypads.dataset_repository.name)
+                        repository_reference=data_hash, repository_type=_pypads_env.pypads.dataset_repository.name,
+                        instance_key=str(instance_key) if instance_key is not None else None)
 
         # Add to repo if needed
         if not pads.dataset_repository.has_object(uid=data_hash):
@@ -229,6 +255,12 @@ class DatasetILF(InjectionLogger):
                                                         description="Dataset binary",
                                                         additional_data=metadata, holder=dto)
 
+            ids_ref = None
+            if ids is not None:
+                ids_ref = repo_obj.log_mem_artifact(dto.name + "_instance_ids", ids, write_format=FileFormats.pickle,
+                                                    description="Instance ids of the dataset",
+                                                    additional_data=metadata, holder=dto)
+
             logger.info("Entry added in the dataset repository.")
 
             documentation = "Documentation missing"
@@ -244,6 +276,7 @@ class DatasetILF(InjectionLogger):
                                           documentation=data_str(dataset_data, "padre:documentation",
                                                                  default=documentation),
                                           binary_references=binary_refs,
+                                          instance_ids_reference=ids_ref,
                                           location=_logger_call.original_call.call_id.context.reference,
                                           additional_data=dataset_data)
             repo_obj.log_json(dro)
@@ -1,23 +1,114 @@
+import os
 import uuid
-from typing import Type, List, Union
+from typing import Type, List, Union, Dict
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel
 from pypads import logger
+from pypads.app.env import InjectionLoggerEnv
 from pypads.app.injections.base_logger import TrackedObject
-from pypads.app.injections.injection import InjectionLogger
+from pypads.app.injections.injection import InjectionLogger, OriginalExecutor
 from pypads.importext.versioning import LibSelector
 from pypads.model.logger_output import TrackedObjectModel, OutputModel
-from pypads.model.models import BaseStorageModel, ResultType, IdReference
+from pypads.model.models import IdReference
 # from pypads_onto.arguments import ontology_uri
 
-from pypads_padre.concepts.util import _tolist, validate_type, _len
+from pypads_padre.concepts.decisions import DecisionSink, ProbabilityEncoding, column, mismatches, is_sparse, \
+    map_chunks, DEFAULT_ROW_GROUP_SIZE
+from pypads_padre.concepts.hashing import dataset_instance_ids, row_hashes
+from pypads_padre.concepts.sampling import DecisionSampler
+from pypads_padre.concepts.util import _len
+from pypads_padre.util import TMP_TEARDOWN_ORDER
 
 ontology_uri = "https://www.padre-lab.eu/onto/"
 
 
+def _merge_counts(counts, values):
+    import numpy as np
+    counts = dict(counts)
+    for c, n in zip(*np.unique(values, return_counts=True)):
+        counts[str(c)] = counts.get(str(c), 0) + int(n)
+    return counts
+
+
+def _decision_sampler(sampling=None, sample_rate=None, sample_size=None, sample_seed=None, **kwargs):
+    """
+    Builds the decision sampler out of the parameters given to the decision loggers.
+    """
+    if sampling is None or sampling == "all":
+        return None
+    try:
+        return DecisionSampler(policy=sampling, rate=sample_rate, size=sample_size, seed=sample_seed)
+    except ValueError as e:
+        logger.warning("Storing all decisions. " + str(e))
+        return None
+
+
+def _merge_label_counts(counts, indicators):
+    import numpy as np
+    counts = dict(counts)
+    for label, n in enumerate(np.asarray(indicators.sum(axis=0)).ravel()):
+        counts[str(label)] = counts.get(str(label), 0) + int(n)
+    return counts
+
+
+def _probability_encoding(probability_encoding=None, probability_top_k=5, probability_threshold=0.01, **kwargs):
+    """
+    Builds the probability encoding out of the parameters given to the decision loggers.
+    """
+    if probability_encoding is None:
+        return None
+    try:
+        return ProbabilityEncoding(encoding=probability_encoding, top_k=probability_top_k,
+                                   threshold=probability_threshold)
+    except ValueError as e:
+        logger.warning("Storing dense probabilities. " + str(e))
+        return None
+
+
+def _next_env(env: InjectionLoggerEnv):
+    """
+    Gets the environment of the next hook in the callback chain of a hooked call.
+    :return: InjectionLoggerEnv or None if the callback is the original function
+    """
+    callback = getattr(env.callback, "__func__", env.callback)
+    inner = (getattr(callback, "__kwdefaults__", None) or {}).get("_pypads_env", None)
+    return inner if isinstance(inner, InjectionLoggerEnv) else None
+
+
+def _with_callback(env: InjectionLoggerEnv, callback):
+    """
+    Copies an environment of a hook with another callback.
+    """
+    return InjectionLoggerEnv(env.mappings, env.hook, callback, env.call, env.parameter, env.experiment_id, env.run_id,
+                              data=env.data)
+
+
+def _call_chain(_pypads_env: InjectionLoggerEnv, fn, _args, _kwargs):
+    """
+    Runs the callback chain of a hook with the original function at its end replaced by fn. Other hooks on the same
+    call still run, only the original function is replaced. The chain is rebuilt on copies of the environments which
+    are passed to the hooks as their _pypads_env, the environments of the call stay untouched.
+    :param fn: Function called with the original function and the arguments of the call
+    :return: Tuple of the result and the execution time
+    """
+    import functools
+    envs = [_pypads_env]
+    while _next_env(envs[-1]) is not None:
+        envs.append(_next_env(envs[-1]))
+    original = envs[-1].callback
+
+    def callback(*args, **kwargs):
+        return fn(original, *args, **kwargs)
+
+    for outer, inner in reversed(list(zip(envs[:-1], envs[1:]))):
+        callback = functools.partial(outer.callback, _pypads_env=_with_callback(inner, callback))
+    return OriginalExecutor(fn=callback)(*_args, **_kwargs)
+
+
 class SingleInstanceTO(TrackedObject):
     """
-        Tracking Object class logging instance based results/decisions of your model.
+        Tracking Object class logging instance based results/decisions of your model. The decisions are stored column
+        wise in a single artifact, the tracked object only holds a summary of them.
     """
 
     class SingleInstancesModel(TrackedObjectModel):
@@ -28,58 +119,163 @@ class SingleInstanceTO(TrackedObject):
             "split_id": {
                 "@id": f"{ontology_uri}of_split",
                 "@type": "rdf:xsd:string"
+            },
+            "number_of_decisions": {
+                "@id": f"{ontology_uri}has_size",
+                "@type": "rdf:xsd:integer"
+            },
+            "accuracy": {
+                "@id": f"{ontology_uri}has_accuracy",
+                "@type": "rdf:xsd:float"
             }
         }
 
-        class DecisionModel(BaseStorageModel):
-            """
-            Model defining the values for a individual model decision.
-            """
-            context: Union[List[str], str, dict] = Field(alias="@context", default={
-                "instance": {
-                    "@id": f"{ontology_uri}is_instance",
-                    "@type": "rdf:XMLLiteral"
-                },
-                "truth": {
-                    "@id": f"{ontology_uri}labeled_as",
-                    "@type": "rdf:XMLLiteral"
-                },
-                "prediction": {
-                    "@id": f"{ontology_uri}predicted_as",
-                    "@type": "rdf:XMLLiteral"
-                }
-
-            })
-            category = "SingleDecision"
-            instance: Union[str, int] = ...
-            truth: Union[str, int] = None
-            prediction: Union[str, int] = ...
-            probabilities: List[float] = []
-            storage_type: Union[str, ResultType] = "decisions"
-
-            class Config:
-                orm_mode = True
-                arbitrary_types_allowed = True
-
         category: str = "InstanceBasedResults"
         name: str = "Instance Based Results"
-        description = "Individual results of the model for each data sample, " \
-                      "e.g, [{'instance': 1, 'truth': 2, 'predicted': 1, probabilities: [0.1,0.5,0.4]}]"
+        description = "Individual results of the model for each data sample, stored as columns " \
+                      "e.g, {'instance': [1, 2], 'truth': [2, 0], 'prediction': [1, 0], " \
+                      "'probabilities': [[0.1,0.5,0.4], [0.8,0.1,0.1]]}"
         split_id: str = ...
-        decisions: List[DecisionModel] = []
+        number_of_decisions: int = 0
+        output_type: str = None  # classification, regression, multi_output or multi_label
+        number_of_outputs: int = None  # Number of values predicted per instance for multi output models
+        number_of_classes: int = None  # Number of columns of the probability matrix
+        columns: List[str] = []  # Columns stored in the decisions artifact
+        accuracy: float = None  # Share of predictions matching the truth if the truth is known
+        number_of_errors: int = None  # Number of predictions not matching the truth if the truth is known
+        mean_absolute_error: float = None  # Mean absolute error of regression values if the truth is known
+        mean_squared_error: float = None  # Mean squared error of regression values if the truth is known
+        prediction_counts: Dict[str, int] = {}  # Number of decisions per predicted class
+        truth_counts: Dict[str, int] = {}  # Number of decisions per true class
+        sampling: str = None  # Sampling policy used to select the stored decisions
+        probability_encoding: str = None  # Encoding of the stored probabilities
+        number_of_stored_decisions: int = 0
+        decisions_reference: str = None  # Reference to the artifact holding the decision columns
 
     @classmethod
     def get_model_cls(cls) -> Type[BaseModel]:
         return cls.SingleInstancesModel
 
-    def __init__(self, *args, split_id: uuid.UUID, parent, **kwargs):
+    def __init__(self, *args, split_id: Union[str, uuid.UUID], parent, encoding: ProbabilityEncoding = None,
+                 classifier: bool = None, **kwargs):
+        """
+        :param classifier: True if the decisions are classes of a classifier, False if they are values of a regressor.
+        Derived from the type of the predictions if None.
+        """
         super().__init__(*args, split_id=str(split_id), parent=parent, **kwargs)
+        self._encoding = encoding
+        self._classifier = classifier
+        if encoding is not None:
+            self.probability_encoding = str(encoding)
+        self._sink = None
+        self._sampler = None
+        self._correct = 0
+        self._absolute_error = 0.0
+        self._squared_error = 0.0
+        self._values = 0
+
+    def _write(self, columns):
+        if self._sink is None:
+            from pypads.utils.logging_util import get_temp_folder
+            self._sink = DecisionSink(os.path.join(get_temp_folder(),
+                                                   "decisions_{}_{}.decisions".format(self.split_id, uuid.uuid4())),
+                                      encoding=self._encoding)
+        self._sink.append(columns)
+
+    def add_decisions(self, instances, predictions, probabilities=None, targets=None, instance_ids=None,
+                      sampler: DecisionSampler = None):
+        """
+        Adds decisions of the split as columns. This can be called multiple times to stream the decisions of the split
+        chunk by chunk. The decisions are written to disk in row groups of a fixed size, only the summary is kept.
+        :param instances: Indices of the instances in the dataset. Predictions are aligned with them.
+        :param predictions: Predictions for the instances
+        :param probabilities: Optional probability scores for the instances
+        :param targets: Optional truth values of the whole dataset indexed by the instances
+        :param instance_ids: Optional stable ids of the whole dataset indexed by the instances
+        :param sampler: Optional sampler selecting the decisions to store. The summary is computed on all decisions.
+        """
+        import numpy as np
+        instances = np.asarray(instances, dtype=np.int64)
+        predictions = column(predictions)
+        if _len(predictions) != len(instances):
+            raise ValueError("Got {} predictions for {} instances.".format(_len(predictions), len(instances)))
+
+        columns = {"instance": instances, "prediction": predictions}
+        if instance_ids is not None:
+            columns["instance_id"] = np.asarray(instance_ids)[instances]
+        if targets is not None:
+            columns["truth"] = column(targets)[instances]
+        if probabilities is not None:
+            columns["probabilities"] = column(probabilities)
+            if columns["probabilities"].ndim > 1:
+                self.number_of_classes = int(columns["probabilities"].shape[-1])
+
+        # Exact aggregates over all decisions
+        self.number_of_decisions += len(instances)
+        self.columns = list(columns.keys())
+        self._aggregate(predictions, columns.get("truth"))
+
+        if sampler is not None:
+            self._sampler = sampler
+            self.sampling = str(sampler)
+        if self._sampler is not None:
+            columns = self._sampler.offer(columns, predictions, columns.get("truth"))
+        self._write(columns)
+        self.number_of_stored_decisions = self._sink.rows + (self._sampler.held if self._sampler is not None else 0)
+
+    def _aggregate(self, predictions, truth=None):
+        """
+        Updates the summary of the decisions by a chunk of predictions depending on their type.
+        """
+        import numpy as np
+        values = predictions.dtype.kind == "f" if self._classifier is None else not self._classifier
+        if is_sparse(predictions):
+            self.output_type = "multi_label"
+            self.number_of_outputs = int(predictions.shape[1])
+            self.prediction_counts = _merge_label_counts(self.prediction_counts, predictions)
+            if truth is not None:
+                self.truth_counts = _merge_label_counts(self.truth_counts, truth)
+        elif values:
+            self.output_type = "regression" if predictions.ndim == 1 else "multi_output"
+        elif predictions.ndim > 1:
+            self.output_type = "multi_output"
+        else:
+            self.output_type = "classification"
+            if predictions.dtype.kind in "biufUSO":
+                self.prediction_counts = _merge_counts(self.prediction_counts, predictions)
+                if truth is not None and truth.ndim == 1 and truth.dtype.kind in "biufUSO":
+                    self.truth_counts = _merge_counts(self.truth_counts, truth)
+        if predictions.ndim > 1:
+            self.number_of_outputs = int(np.prod(predictions.shape[1:]))
+
+        if truth is None or predictions.shape[0] == 0:
+            return
+        try:
+            if not is_sparse(predictions) and values:
+                diff = (predictions - np.asarray(truth, dtype=float)).ravel()
+                self._absolute_error += float(np.abs(diff).sum())
+                self._squared_error += float(np.dot(diff, diff))
+                self._values += diff.size
+                self.mean_absolute_error = self._absolute_error / self._values
+                self.mean_squared_error = self._squared_error / self._values
+            else:
+                self._correct += int(predictions.shape[0] - np.count_nonzero(mismatches(predictions, truth)))
+                self.number_of_errors = self.number_of_decisions - self._correct
+                self.accuracy = self._correct / self.number_of_decisions
+        except Exception as e:
+            logger.warning("Couldn't compare the predictions to the truth values because %s" % str(e))
 
-    def add_decision(self, instance, truth, prediction, probabilities):
-        self.decisions.append(
-            self.SingleInstancesModel.DecisionModel(instance=validate_type(instance),
-                                                    truth=validate_type(truth), prediction=validate_type(prediction),
-                                                    probabilities=validate_type(probabilities)))
+    def store(self):
+        if self._sampler is not None:
+            self._write(self._sampler.drain())
+        if self._sink is not None:
+            self.number_of_stored_decisions = self._sink.rows
+            path = self._sink.close()
+            if path is not None:
+                self.decisions_reference = self.store_artifact(path, None, description="Decision columns of the split")
+                os.remove(path)
+            self._sink = None
+        return super().store()
 
 
 class SingleInstanceOuptut(OutputModel):
@@ -98,6 +294,16 @@ class SingleInstanceILF(InjectionLogger):
 
         Hook:
             Hook this logger to the inference function of your model (predict, forward,...)
+
+        Sampling:
+            Pass sampling="rate"|"reservoir"|"stratified"|"errors" together with sample_rate and/or sample_size (and
+            optionally sample_seed) as hook parameters to store only a sample of the decisions of each split. Counts
+            and accuracy are still computed on all decisions.
+
+        Probability encoding:
+            Pass probability_encoding="float32"|"float16"|"topk"|"sparse" (with probability_top_k or
+            probability_threshold) as hook parameters to store the probabilities compactly. results.get_decisions
+            reconstructs the dense matrix.
     """
     name = "SingleInstance"
     category = "SingleInstanceLogger"
@@ -106,6 +312,53 @@ class SingleInstanceILF(InjectionLogger):
     def output_schema_class(cls) -> Type[OutputModel]:
         return SingleInstanceOuptut
 
+    @staticmethod
+    def _current_split(pads):
+        """
+        Resolves the split the current predictions belong to.
+        :return: Tuple of the id of the split, the split (None if unknown) and the tracking mode
+        """
+        split_id = pads.cache.run_get("current_split")
+        split_tracker = pads.cache.run_get("split_tracker")
+        if split_id is None or split_tracker is None:
+            return split_id, None, pads.cache.get("tracking_mode", "single")
+        return split_id, split_tracker.splits.get(str(split_id), None), pads.cache.get("tracking_mode", "single")
+
+    @staticmethod
+    def _classifier(ctx):
+        """
+        Checks if the model is a classifier.
+        :return: True for classifiers, False for regressors or None if it isn't known
+        """
+        return None
+
+    def _split_accumulator(self, pads, _pypads_env, n, derive_predictions=None, classifier=None):
+        """
+        Gets an accumulator streaming outputs into the decisions of the current split if the n inputs are the test set
+        of the split.
+        :return: DecisionAccumulator or None if the inputs can't be mapped to the split
+        """
+        import numpy as np
+        split_id, split, mode = self._current_split(pads)
+        if split is None or mode == "multiple" or split.test_set is None or len(split.test_set) != n:
+            return None
+        parameters = {**self.static_parameters, **_pypads_env.parameter}
+        return DecisionAccumulator(split_id, np.asarray(split.test_set, dtype=np.int64),
+                                   sampler=_decision_sampler(**parameters),
+                                   encoding=_probability_encoding(**parameters),
+                                   derive_predictions=derive_predictions, classifier=classifier)
+
+    def _decision_key(self, ctx, _logger_call, split_id, predictions):
+        """
+        Key of the decisions written for a split in multiple mode. It identifies the split, the estimator, the hooked
+        function and the content of the predictions, such that another model, a refit or another logger still writes
+        its decisions for splits already decided.
+        """
+        import hashlib
+        estimator = "{}.{}:{}".format(type(ctx).__module__, type(ctx).__qualname__, id(ctx))
+        function = "{}:{}".format(self.__class__.__name__, _logger_call.original_call.call_id.wrappee.__name__)
+        return split_id, estimator, function, hashlib.sha256(row_hashes(predictions).tobytes()).hexdigest()
+
     def __post__(self, ctx, *args, _logger_call, _pypads_pre_return, _pypads_result, _logger_output, _args, _kwargs,
                  **kwargs):
         """
@@ -118,6 +371,13 @@ class SingleInstanceILF(InjectionLogger):
         from pypads.app.pypads import get_current_pads
         pads = get_current_pads()
 
+        # Decisions might already be streamed chunk by chunk during the inference
+        if pads.cache.run_exists("streamed_decisions"):
+            pads.cache.run_pop("predictions")
+            pads.cache.run_pop("probabilities")
+            _logger_output.individual_decisions = pads.cache.run_pop("streamed_decisions").flush()
+            return
+
         preds = _pypads_result
         if pads.cache.run_exists("predictions"):
             preds = pads.cache.run_pop("predictions")
@@ -132,17 +392,11 @@ class SingleInstanceILF(InjectionLogger):
         if pads.cache.run_exists("targets"):
             targets = pads.cache.run_get("targets")
 
+        # check if there are stable ids for the instances of the tracked dataset
+        instance_ids = dataset_instance_ids(pads)
+
         # check if there exists information about the current split
-        current_split = None
-        split_id = None
-        mode = None
-        splits = None
-        if pads.cache.run_exists("current_split"):
-            split_id = pads.cache.run_get("current_split")
-            splitter = pads.cache.run_get(pads.cache.run_get("split_tracker"))
-            splits = splitter.get("output").splits.splits
-            mode = pads.cache.get("tracking_mode", "single")
-            current_split = splits.get(str(split_id), None)
+        split_id, current_split, mode = self._current_split(pads)
 
         # depending on available info log the predictions
         if current_split is None:
@@ -152,40 +406,43 @@ class SingleInstanceILF(InjectionLogger):
             logger.info(
                 "Logging single instance / individual decisions depending on the availability of split information, "
                 "predictions, probabilites and target values.")
-            if mode == "multiple" and _len(preds) == _len(targets):
+            if mode == "multiple" and targets is not None and _len(preds) == _len(targets):
+                # Predictions cover the whole dataset. Write the decisions of each split not written yet.
+                import numpy as np
+                preds = column(preds)
+                if probabilities is not None:
+                    probabilities = column(probabilities)
+                decided = pads.cache.run_get("decided_splits") or {}
                 _logger_output.individual_decisions = []
-                for split_id, split in splits.items():
-                    decisions = SingleInstanceTO(split_id=uuid.UUID(split_id), parent=_logger_output)
-                    if split.test_set is not None:
-                        try:
-                            for i, instance in enumerate(split.test_set):
-                                prediction = preds[i]
-                                probability_scores = []
-                                if probabilities is not None:
-                                    probability_scores = _tolist(probabilities[i])
-                                truth = None
-                                if targets is not None:
-                                    truth = targets[instance]
-                                decisions.add_decision(instance=instance, truth=truth, prediction=prediction,
-                                                       probabilities=probability_scores)
-                            _logger_output.individual_decisions.append(decisions.store())
-                        except Exception as e:
-                            logger.warning(
-                                "Could not log single instance decisions due to this error '%s'" % str(e))
+                for split_id, split in pads.cache.run_get("split_tracker").splits.items():
+                    if split.test_set is None or len(split.test_set) == 0:
+                        continue
+                    test_idx = np.asarray(split.test_set, dtype=np.int64)
+                    # Only skip repeats of the same predictions of the same estimator on the split
+                    key = self._decision_key(ctx, _logger_call, split_id, preds[test_idx])
+                    if key in decided:
+                        continue
+                    try:
+                        decisions = SingleInstanceTO(split_id=split_id, parent=_logger_output,
+                                                     encoding=_probability_encoding(**kwargs),
+                                                     classifier=self._classifier(ctx))
+                        decisions.add_decisions(test_idx, preds[test_idx],
+                                                probabilities[test_idx] if probabilities is not None else None,
+                                                targets, instance_ids, _decision_sampler(**kwargs))
+                        reference = decisions.store()
+                        _logger_output.individual_decisions.append(reference)
+                        pads.cache.run_add("decided_splits", {key: reference})
+                    except Exception as e:
+                        logger.warning(
+                            "Could not log single instance decisions due to this error '%s'" % str(e))
             else:
-                decisions = SingleInstanceTO(split_id=split_id, parent=_logger_output)
+                decisions = SingleInstanceTO(split_id=split_id, parent=_logger_output,
+                                             encoding=_probability_encoding(**kwargs),
+                                             classifier=self._classifier(ctx))
                 if current_split.test_set is not None:
                     try:
-                        for i, instance in enumerate(current_split.test_set):
-                            prediction = preds[i]
-                            probability_scores = []
-                            if probabilities is not None:
-                                probability_scores = _tolist(probabilities[i])
-                            truth = None
-                            if targets is not None:
-                                truth = targets[instance]
-                            decisions.add_decision(instance=instance, truth=truth, prediction=prediction,
-                                                   probabilities=probability_scores)
+                        decisions.add_decisions(current_split.test_set, preds, probabilities, targets,
+                                                instance_ids, _decision_sampler(**kwargs))
                         _logger_output.individual_decisions = decisions.store()
                     except Exception as e:
                         logger.warning("Could not log single instance decisions due to this error '%s'" % str(e))
@@ -196,62 +453,332 @@ class DecisionsSklearnILF(SingleInstanceILF):
     Function getting the prediction scores from sklearn estimators
         Hook:
             Hook this logger to the inference function of your model, i.e. sklearn.BaseEstimator.predict.
+
+    For estimators whose prediction is the class with the highest score, the scores are computed only once and the
+    prediction is derived from them with classes_ instead of running the inference a second time. Other estimators
+    fall back to computing predict_proba in addition to the hooked function. Set the hook parameter
+    single_inference=False to always use the fallback.
+
+    Inputs with more than chunk_size rows (hook parameter) are scored chunk by chunk. If the inputs are the test set of
+    the current split, each chunk is streamed into the decisions of the split, such that the probability matrix of all
+    inputs is never held at once. For estimators releasing the GIL the chunks are scored on n_jobs threads. At most
+    n_jobs chunks are held in memory then.
     """
     name = "Sklearn Decisions Logger"
     type = "SklearnDecisionsLogger"
 
     supported_libraries = {LibSelector(name="sklearn", constraint="*", specificity=1)}
 
+    # Estimators of sklearn for which predict equals classes_[argmax] of the given scoring function
+    single_inference_estimators = {
+        "LogisticRegression": "predict_proba",
+        "LogisticRegressionCV": "predict_proba",
+        "DecisionTreeClassifier": "predict_proba",
+        "ExtraTreeClassifier": "predict_proba",
+        "RandomForestClassifier": "predict_proba",
+        "ExtraTreesClassifier": "predict_proba",
+        "GradientBoostingClassifier": "predict_proba",
+        "HistGradientBoostingClassifier": "predict_proba",
+        "KNeighborsClassifier": "predict_proba",
+        "GaussianNB": "predict_proba",
+        "MultinomialNB": "predict_proba",
+        "BernoulliNB": "predict_proba",
+        "ComplementNB": "predict_proba",
+        "CategoricalNB": "predict_proba",
+        "LinearDiscriminantAnalysis": "predict_proba",
+        "QuadraticDiscriminantAnalysis": "predict_proba",
+        "MLPClassifier": "predict_proba",
+        "CalibratedClassifierCV": "predict_proba",
+        "LinearSVC": "decision_function",
+        "RidgeClassifier": "decision_function",
+        "RidgeClassifierCV": "decision_function",
+        "SGDClassifier": "decision_function",
+        "Perceptron": "decision_function",
+        "PassiveAggressiveClassifier": "decision_function",
+    }
+
+    # Estimators of sklearn whose scoring functions spend their time in numpy, BLAS or cython code releasing the GIL
+    threaded_estimators = {
+        "LogisticRegression", "LogisticRegressionCV", "DecisionTreeClassifier", "ExtraTreeClassifier",
+        "RandomForestClassifier", "ExtraTreesClassifier", "GaussianNB", "MultinomialNB", "BernoulliNB", "ComplementNB",
+        "LinearDiscriminantAnalysis", "QuadraticDiscriminantAnalysis", "MLPClassifier", "LinearSVC", "RidgeClassifier",
+        "RidgeClassifierCV", "SGDClassifier", "Perceptron", "PassiveAggressiveClassifier"
+    }
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.identity = SingleInstanceILF.__name__
 
+    @staticmethod
+    def _classifier(ctx):
+        from sklearn.base import is_classifier, is_regressor
+        if is_classifier(ctx) or getattr(ctx, "classes_", None) is not None:
+            return True
+        if is_regressor(ctx):
+            return False
+        return None
+
+    @staticmethod
+    def _sklearn_name(ctx):
+        """
+        Name of the estimator class if the class is defined by sklearn itself. User subclasses and classes of other
+        packages sharing the name aren't known to keep the semantics of the sklearn estimators.
+        """
+        klass = type(ctx)
+        module = getattr(klass, "__module__", None) or ""
+        return klass.__qualname__ if module == "sklearn" or module.startswith("sklearn.") else None
+
+    @staticmethod
+    def _original(ctx, fn_name, _logger_call):
+        """
+        Gets the unwrapped scoring function of the estimator to invoke it without triggering the tracking.
+        """
+        fn = getattr(ctx, fn_name, None)
+        if fn is None:
+            return None
+        context = _logger_call.original_call.call_id.context
+        if context.has_original(fn):
+            fn = context.original(fn)
+        if hasattr(fn, "__wrapped__"):
+            fn = fn.__wrapped__
+        return fn
+
+    @staticmethod
+    def _invoke(fn, ctx, _args, _kwargs):
+        try:
+            return fn(*_args, **_kwargs)
+        except TypeError:
+            return fn.__get__(ctx)(*_args, **_kwargs)
+
+    def _scoring(self, ctx, _logger_call):
+        """
+        Gets the scoring function of the estimator its predictions can be derived from.
+        :return: Tuple of the scoring function and the classes or None if the estimator is not known to support this.
+        """
+        import numpy as np
+        fn_name = self.single_inference_estimators.get(self._sklearn_name(ctx))
+        classes = getattr(ctx, "classes_", None)
+        if fn_name is None or classes is None:
+            return None
+        try:
+            classes = np.asarray(classes)
+        except ValueError:
+            # Ragged classes of a multi output estimator
+            return None
+        if classes.ndim != 1 or classes.dtype.kind == "O" and any(np.ndim(c) > 0 for c in classes):
+            return None
+        fn = self._original(ctx, fn_name, _logger_call)
+        if fn is None:
+            return None
+        return fn, classes
+
+    @staticmethod
+    def _derive_predictions(scores, classes):
+        import numpy as np
+        if scores.ndim == 1:
+            # Binary decision function scoring the second class
+            return classes[(scores > 0).astype(np.int64)]
+        if scores.ndim == 2 and scores.shape[1] == len(classes):
+            return classes[scores.argmax(axis=1)]
+        return None
+
+    def _single_inference(self, ctx, _logger_call, _args, _kwargs):
+        """
+        Computes the scores of the estimator once and derives the predictions from them.
+        :return: Tuple of scores and predictions or None if the estimator is not known to support this.
+        """
+        import numpy as np
+        scoring = self._scoring(ctx, _logger_call)
+        if scoring is None:
+            return None
+        fn, classes = scoring
+        scores = np.asarray(self._invoke(fn, ctx, _args, _kwargs))
+        predictions = self._derive_predictions(scores, classes)
+        if predictions is None:
+            return None
+        return scores, predictions
+
+    @staticmethod
+    def _inputs(_args, _kwargs):
+        return _args[0] if len(_args) > 0 else _kwargs.get("X", None)
+
+    @staticmethod
+    def _chunked(x, chunk_size):
+        if chunk_size is None or x is None:
+            return False
+        try:
+            return _len(x) > chunk_size
+        except TypeError:
+            return False
+
+    def _chunked_inference(self, ctx, _pypads_env, _logger_call, _logger_output, _args, _kwargs,
+                           chunk_size=DEFAULT_ROW_GROUP_SIZE, n_jobs=None, single_inference=True, **kwargs):
+        """
+        Runs the inference on the inputs chunk by chunk. If the predictions can be derived from the scores of the
+        estimator only the scores are computed in place of the hooked function. Otherwise the hooked function is run as
+        is and only the probabilities are computed chunk wise. The probabilities of all inputs are only kept if they are
+        not streamed into the decisions of the current split but still needed for them.
+        :return: Tuple of the predictions and the execution time
+        """
+        import numpy as np
+        from pypads.app.pypads import get_current_pads
+        pads = get_current_pads()
+
+        x = self._inputs(_args, _kwargs)
+        n = _len(x)
+        scoring = None
+        if single_inference and _logger_call.original_call.call_id.wrappee.__name__ == "predict":
+            scoring = self._scoring(ctx, _logger_call)
+        if scoring is None:
+            fn, classes = self._original(ctx, "predict_proba", _logger_call) or self._original(
+                ctx, "_predict_proba", _logger_call), None
+        else:
+            fn, classes = scoring
+
+        def _score(chunk):
+            if len(_args) > 0:
+                return np.asarray(self._invoke(fn, ctx, (chunk,) + tuple(_args[1:]), _kwargs))
+            return np.asarray(self._invoke(fn, ctx, _args, {**_kwargs, "X": chunk}))
+
+        if n_jobs is None:
+            n_jobs = min(4, os.cpu_count() or 1)
+        threads = n_jobs if self._sklearn_name(ctx) in self.threaded_estimators else None
+        accumulator = self._split_accumulator(pads, _pypads_env, n, classifier=self._classifier(ctx))
+        keep = accumulator is None and self._current_split(pads)[1] is not None
+
+        def _run(derived, probabilities=None):
+            for start, scores in map_chunks(_score, x, chunk_size, threads):
+                stop = start + len(scores)
+                if classes is not None:
+                    chunk_predictions = self._derive_predictions(scores, classes)
+                    if chunk_predictions is None:
+                        raise ValueError("scores of shape {} don't match the classes".format(scores.shape))
+                    if derived is None:
+                        derived = np.empty((n,) + chunk_predictions.shape[1:], dtype=chunk_predictions.dtype)
+                    derived[start:stop] = chunk_predictions
+                if accumulator is not None:
+                    accumulator.add(scores, _logger_output, predictions=derived[start:stop])
+                    continue
+                if not keep:
+                    continue
+                if probabilities is None:
+                    probabilities = np.empty((n,) + scores.shape[1:], dtype=scores.dtype)
+                probabilities[start:stop] = scores
+            return derived, probabilities
+
+        def _cache(predictions, probabilities):
+            if accumulator is not None:
+                pads.cache.run_add("streamed_decisions", accumulator)
+            else:
+                pads.cache.run_add("probabilities", probabilities)
+            pads.cache.run_add("predictions", predictions)
+
+        if classes is None:
+            predictions, time = super().__call_wrapped__(ctx, _pypads_env=_pypads_env, _logger_call=_logger_call,
+                                                         _logger_output=_logger_output, _args=_args, _kwargs=_kwargs)
+            if fn is None or accumulator is None and not keep:
+                return predictions, time
+            try:
+                _, probabilities = _run(column(predictions))
+            except Exception as e:
+                logger.warning("Couldn't compute probabilities because %s" % str(e))
+                return predictions, time
+            _cache(predictions, probabilities)
+            return predictions, time
+
+        def _inference(original, *args, **kwargs):
+            try:
+                derived, probabilities = _run(None)
+            except Exception as e:
+                logger.warning("Couldn't derive predictions from a chunked inference because %s. "
+                               "Falling back to the hooked function." % str(e))
+                return original(*args, **kwargs)
+            _cache(derived, probabilities)
+            return derived
+
+        return _call_chain(_pypads_env, _inference, _args, _kwargs)
+
     def __pre__(self, ctx, *args,
-                _logger_call, _logger_output, _args, _kwargs, **kwargs):
+                _logger_call, _logger_output, _args, _kwargs, single_inference=True,
+                chunk_size=DEFAULT_ROW_GROUP_SIZE, **kwargs):
         """
 
         :param ctx:
         :param args:
+        :param single_inference: Derive the predictions from the scores if the estimator supports it
+        :param chunk_size: Number of rows above which the inputs are scored chunk by chunk
         :param kwargs:
         :return:
         """
         from pypads.app.pypads import get_current_pads
         pads = get_current_pads()
 
+        # Large inputs are scored chunk by chunk in __call_wrapped__
+        if self._chunked(self._inputs(_args, _kwargs), chunk_size):
+            pads.cache.run_add("chunked_inference", True)
+            return
+
+        # Only predict can be replaced. fit_predict has to be executed for its side effects.
+        if single_inference and _logger_call.original_call.call_id.wrappee.__name__ == "predict":
+            try:
+                captured = self._single_inference(ctx, _logger_call, _args, _kwargs)
+                if captured is not None:
+                    probabilities, predictions = captured
+                    pads.cache.run_add("probabilities", probabilities)
+                    pads.cache.run_add("predictions", predictions)
+                    pads.cache.run_add("single_inference", predictions)
+                    return
+            except Exception as e:
+                logger.warning("Couldn't derive predictions from a single inference because %s. "
+                               "Falling back to the hooked function." % str(e))
+
         # check if the estimator computes decision scores
         probabilities = None
-        predict_proba = None
-        if hasattr(ctx, "predict_proba"):
-            # TODO find a cleaner way to invoke the original predict_proba in case it is wrapped
-            predict_proba = ctx.predict_proba
-            if _logger_call.original_call.call_id.context.has_original(predict_proba):
-                predict_proba = _logger_call.original_call.call_id.context.original(predict_proba)
-        elif hasattr(ctx, "_predict_proba"):
-            predict_proba = ctx._predict_proba
-            if _logger_call.original_call.call_id.context.has_original(predict_proba):
-                _logger_call.original_call.call_id.context.original(predict_proba)
-        if hasattr(predict_proba, "__wrapped__"):
-            predict_proba = predict_proba.__wrapped__
+        predict_proba = self._original(ctx, "predict_proba", _logger_call) or self._original(ctx, "_predict_proba",
+                                                                                            _logger_call)
         try:
-            probabilities = predict_proba(*_args, **_kwargs)
+            if predict_proba is not None:
+                probabilities = self._invoke(predict_proba, ctx, _args, _kwargs)
         except Exception as e:
-            if isinstance(e, TypeError):
-                try:
-                    predict_proba = predict_proba.__get__(ctx)
-                    probabilities = predict_proba(*_args, **_kwargs)
-                except Exception as ee:
-                    logger.warning("Couldn't compute probabilities because %s" % str(ee))
-            else:
-                logger.warning("Couldn't compute probabilities because %s" % str(e))
+            logger.warning("Couldn't compute probabilities because %s" % str(e))
         finally:
             pads.cache.run_add("probabilities", probabilities)
 
+    def __call_wrapped__(self, ctx, *args, _pypads_env, _logger_call, _logger_output, _args, _kwargs, **kwargs):
+        from pypads.app.pypads import get_current_pads
+        pads = get_current_pads()
+
+        # Return the predictions derived in __pre__ in place of the original function instead of running the inference
+        # again. Other hooks on the call still run.
+        if pads.cache.run_exists("single_inference"):
+            predictions = pads.cache.run_pop("single_inference")
+            return _call_chain(_pypads_env, lambda original, *args, **kwargs: predictions, _args, _kwargs)
+        if pads.cache.run_pop("chunked_inference", default=False):
+            return self._chunked_inference(ctx, _pypads_env=_pypads_env, _logger_call=_logger_call,
+                                           _logger_output=_logger_output, _args=_args, _kwargs=_kwargs,
+                                           **{**self.static_parameters, **_pypads_env.parameter})
+        return super().__call_wrapped__(ctx, *args, _pypads_env=_pypads_env, _logger_call=_logger_call,
+                                        _logger_output=_logger_output, _args=_args, _kwargs=_kwargs, **kwargs)
+
+
+def _keras_classes(probabilities):
+    """
+    Derives the classes from the probability output of a keras model the same way predict_classes does.
+    """
+    if probabilities.shape[-1] > 1:
+        return probabilities.argmax(axis=-1)
+    return (probabilities > 0.5).astype('int32')
+
 
 class DecisionsKerasILF(SingleInstanceILF):
     """
     Function getting the prediction scores from keras models.
         Hook:
             Hook this logger to the inference function of your model, i.e. keras.engine.training.Model.predict_classes.
+
+    The original predict_classes is replaced by a single call of predict, the classes are derived from its outputs. If
+    the inputs are the test set of the current split, the outputs are added to the decisions of the split right away.
+    Other hooks on predict_classes still run.
     """
     name = "Keras Decisions Logger"
     category = "KerasDecisionsLogger"
@@ -262,25 +789,154 @@ class DecisionsKerasILF(SingleInstanceILF):
         super().__init__(*args, **kwargs)
         self.identity = SingleInstanceILF.__name__
 
-    def __pre__(self, ctx, *args,
-                _logger_call, _logger_output, _args, _kwargs, **kwargs):
-        """
+    @staticmethod
+    def _sliceable(x):
+        import numpy as np
+        inputs = x if isinstance(x, (list, tuple)) else [x]
+        return len(inputs) > 0 and all(isinstance(i, np.ndarray) for i in inputs)
 
-        :param ctx:
-        :param args:
-        :param kwargs:
-        :return:
+    @staticmethod
+    def _predict(ctx, x, batch_size=32, verbose=0, _accumulator=None, _parent=None, **kwargs):
+        """
+        Runs the model once with predict and derives the classes from the outputs. The outputs are added to the given
+        decision accumulator if there is one.
+        :return: Tuple of probabilities (None if added to the accumulator) and classes
+        """
+        import numpy as np
+        probabilities = np.asarray(ctx.predict(x, batch_size=batch_size, verbose=verbose, **kwargs))
+        classes = _keras_classes(probabilities)
+        if _accumulator is not None:
+            _accumulator.add(probabilities, _parent, predictions=classes)
+            return None, classes
+        return probabilities, classes
+
+    def _accumulator(self, pads, _pypads_env, x):
+        """
+        Gets an accumulator streaming the outputs into the decisions of the current split if the inputs are the test
+        set of the split.
         """
+        if not self._sliceable(x):
+            return None
+        inputs = x if isinstance(x, (list, tuple)) else [x]
+        return self._split_accumulator(pads, _pypads_env, len(inputs[0]), derive_predictions=_keras_classes)
+
+    def __call_wrapped__(self, ctx, *args, _pypads_env, _logger_call, _logger_output, _args, _kwargs, **kwargs):
         from pypads.app.pypads import get_current_pads
         pads = get_current_pads()
 
-        probabilities = None
-        try:
-            probabilities = ctx.predict(*_args, **_kwargs)
-        except Exception as e:
-            logger.warning("Couldn't compute probabilities because %s" % str(e))
+        fn_name = _logger_call.original_call.call_id.wrappee.__name__
+        if fn_name == "predict_classes":
+            x = _args[0] if len(_args) > 0 else _kwargs.get("x")
+            accumulator = self._accumulator(pads, _pypads_env, x)
 
-        pads.cache.run_add("probabilities", probabilities)
+            def _predict_classes(original, *args, **kwargs):
+                try:
+                    probabilities, classes = self._predict(ctx, *args, _accumulator=accumulator,
+                                                           _parent=_logger_output, **kwargs)
+                except Exception as e:
+                    logger.warning("Couldn't compute probabilities because %s. Falling back to the hooked function."
+                                   % str(e))
+                    return original(*args, **kwargs)
+                if accumulator is not None:
+                    pads.cache.run_add("streamed_decisions", accumulator)
+                else:
+                    pads.cache.run_add("probabilities", probabilities)
+                pads.cache.run_add("predictions", classes)
+                return classes
+
+            return _call_chain(_pypads_env, _predict_classes, _args, _kwargs)
+
+        _return, time = super().__call_wrapped__(ctx, *args, _pypads_env=_pypads_env, _logger_call=_logger_call,
+                                                 _logger_output=_logger_output, _args=_args, _kwargs=_kwargs,
+                                                 **kwargs)
+        if fn_name == "predict":
+            # The output of predict already holds the probabilities
+            try:
+                import numpy as np
+                pads.cache.run_add("probabilities", np.asarray(_return))
+                pads.cache.run_add("predictions", _keras_classes(np.asarray(_return)))
+            except Exception as e:
+                logger.warning("Couldn't derive classes because %s" % str(e))
+        return _return, time
+
+
+def _torch_decisions(outputs):
+    """
+    Derives the predictions from the outputs of a torch model. Outputs with a single column are taken as regression
+    values, otherwise the class with the highest score is predicted.
+    :return: Tuple of predictions and probabilities (None for regression values)
+    """
+    if outputs.ndim > 1 and outputs.shape[1] > 1:
+        return outputs.argmax(axis=1), outputs
+    return outputs.reshape(len(outputs)), None
+
+
+class DecisionAccumulator:
+    """
+    Accumulates the outputs of a model over an epoch. The outputs of every batch are mapped to the dataset indices by
+    the captured order of the epoch and streamed into the decisions of the epoch, which are written to disk in row
+    groups of a fixed size.
+    """
+
+    def __init__(self, split_id, indices, sampler=None, encoding=None, derive_predictions=None, classifier=None):
+        self.split_id = split_id
+        self.indices = indices
+        self.sampler = sampler
+        self.encoding = encoding
+        self.derive_predictions = derive_predictions
+        self.classifier = classifier
+        self.position = 0
+        self.decisions = None
+        self._targets = None
+        self._instance_ids = None
+
+    @property
+    def full(self):
+        return self.position >= len(self.indices)
+
+    def add(self, outputs, parent, predictions=None):
+        """
+        Adds the outputs of a batch to the decisions of the epoch.
+        :param outputs: numpy array of the batch outputs
+        :param parent: Output to add the decisions to if they are not created yet
+        :param predictions: Predictions of the batch if they are not to be derived from the outputs
+        :return: False if the outputs don't fit into the remaining epoch
+        """
+        n = len(outputs)
+        if self.position + n > len(self.indices):
+            return False
+        if self.decisions is None:
+            from pypads.app.pypads import get_current_pads
+            pads = get_current_pads()
+            self._targets = pads.cache.run_get("targets") if pads.cache.run_exists("targets") else None
+            self._instance_ids = dataset_instance_ids(pads)
+            self.decisions = SingleInstanceTO(split_id=self.split_id, parent=parent, encoding=self.encoding,
+                                              classifier=self.classifier)
+        if predictions is not None:
+            probabilities = outputs
+        elif self.derive_predictions is not None:
+            predictions, probabilities = self.derive_predictions(outputs), outputs
+        else:
+            predictions, probabilities = _torch_decisions(outputs)
+        self.decisions.add_decisions(self.indices[self.position:self.position + n], predictions, probabilities,
+                                     self._targets, self._instance_ids, self.sampler)
+        self.position += n
+        return True
+
+    def flush(self):
+        """
+        Stores the accumulated decisions as a single decisions artifact.
+        :return: Reference to the stored decisions or None if nothing was accumulated
+        """
+        if self.decisions is None:
+            return None
+        decisions, self.decisions = self.decisions, None
+        return decisions.store()
+
+
+def _flush_decision_accumulator(pads, *args, **kwargs):
+    if pads.cache.run_exists("decision_accumulator"):
+        pads.cache.run_pop("decision_accumulator").flush()
 
 
 class DecisionsTorchILF(SingleInstanceILF):
@@ -288,6 +944,10 @@ class DecisionsTorchILF(SingleInstanceILF):
     Function getting the prediction scores from torch models.
         Hook:
             Hook this logger to the inference function of your model, e.g, torch.modules.container.Sequential.forward.
+
+    If the index order of the current evaluation epoch was captured by the torch split logger, the outputs of each
+    batch are streamed into the decisions of the epoch. These are stored at once when the epoch is complete, a new
+    epoch starts or the run ends.
     """
     name = "PyTorch Decisions Logger"
     category = "TorchDecisionsLogger"
@@ -306,8 +966,34 @@ class DecisionsTorchILF(SingleInstanceILF):
         if hasattr(ctx, "training") and ctx.training:
             pass
         else:
-            pads.cache.run_add("probabilities", _pypads_result.data.numpy())
-            pads.cache.run_add("predictions", _pypads_result.argmax(dim=1).data.numpy())
+            outputs = _pypads_result.detach().cpu().numpy()
+
+            order = pads.cache.run_get("epoch_order") if pads.cache.run_exists("epoch_order") else None
+            if order is not None:
+                accumulator = pads.cache.run_get("decision_accumulator") if pads.cache.run_exists(
+                    "decision_accumulator") else None
+                if accumulator is None or accumulator.indices is not order["indices"]:
+                    # A new epoch started
+                    if accumulator is not None:
+                        _logger_output.individual_decisions = accumulator.flush()
+                    accumulator = DecisionAccumulator(order["split_id"], order["indices"],
+                                                      sampler=_decision_sampler(**kwargs),
+                                                      encoding=_probability_encoding(**kwargs))
+                    pads.cache.run_add("decision_accumulator", accumulator)
+                    pads.api.register_teardown_utility("decision_accumulator_flush", _flush_decision_accumulator,
+                                                       order=TMP_TEARDOWN_ORDER)
+                if accumulator.add(outputs, _logger_output):
+                    if accumulator.full:
+                        _logger_output.individual_decisions = accumulator.flush()
+                        pads.cache.run_pop("decision_accumulator")
+                        pads.cache.run_pop("epoch_order")
+                    return
+                logger.warning("Outputs of the model don't match the captured order of the epoch. "
+                               "Tracking the decisions of the batch on its own.")
+
+            predictions, probabilities = _torch_decisions(outputs)
+            pads.cache.run_add("probabilities", probabilities)
+            pads.cache.run_add("predictions", predictions)
 
             return super().__post__(ctx, *args, _logger_call=_logger_call, _pypads_pre_return=_pypads_pre_return,
                                     _pypads_result=_pypads_result, _logger_output=_logger_output, _args=_args,
@@ -11,6 +11,41 @@ from pypads.model.models import BaseStorageModel, ResultType
 from pypads.utils.logging_util import data_str, data_path
 from pypads.utils.util import persistent_hash
 
+from pypads_padre.util import TMP_TEARDOWN_ORDER
+
+# Repository hashes of the estimators tracked by this process keyed by (estimator class, hash of the mappings). Only the
+# hashes of the current tracking uri are kept.
+_estimator_hashes = {}
+
+
+def _repository_hashes(uri):
+    """
+    Gets the repository hashes of the estimators known for a tracking uri. The hashes of other tracking uris are dropped.
+    """
+    if uri not in _estimator_hashes:
+        _estimator_hashes.clear()
+        _estimator_hashes[uri] = {}
+    return _estimator_hashes[uri]
+
+
+def _mapping_hash(_pypads_env):
+    """
+    Stable hash of the mappings an estimator is tracked with. Mappings are identified by the hash of their mapping file
+    and their reference in it. Without mappings the mapping data itself is hashed.
+    """
+    references = sorted("{}:{}".format(getattr(mm.mapping.in_collection, "uid", None), mm.mapping.reference)
+                        for mm in _pypads_env.mappings or [])
+    return persistent_hash("|".join(references) if len(references) > 0 else str(_pypads_env.data))
+
+
+def _store_estimator_inits(pads, *args, **kwargs):
+    """
+    Stores the tracked estimators again to persist their final number of inits.
+    """
+    for eto, _ in (pads.cache.run_get("estimators") or {}).values():
+        if eto.number_of_inits > 1:
+            eto.store()
+
 
 class EstimatorRepositoryObject(BaseStorageModel):
     """
@@ -51,6 +86,7 @@ class EstimatorTO(TrackedObject):
         repository_reference: str = ...  # reference to the estimator in the repository
         repository_type: str = ...  # type of the repository. Will always be extracted from the repository aka
         # 'pypads_estimators'
+        number_of_inits: int = 1  # Number of times the estimator was initialized in the run e.g. by clone
 
     @classmethod
     def get_model_cls(cls) -> Type[BaseModel]:
@@ -88,6 +124,9 @@ class EstimatorILF(InjectionLogger):
                           default_value: "'auto'"
                           path: presort
                       execution_parameters: []
+
+    Repeated inits of the same estimator class (e.g. clones in a grid search) are tracked once per run. The tracked
+    object counts the inits, the repository entry is hashed once per process.
     """
 
     name = "Estimator Logger"
@@ -116,6 +155,39 @@ class EstimatorILF(InjectionLogger):
 
         # Get data from mapping file
         mapping_data = _pypads_env.data
+        key = (ctx.__class__, _mapping_hash(_pypads_env))
+
+        # Collapse repeated inits into the already tracked estimator of the run
+        estimators = _pypads_env.pypads.cache.run_get("estimators") or {}
+        if key in estimators:
+            eto, reference = estimators[key]
+            eto.number_of_inits += 1
+            _logger_output.estimator = reference
+            return
+
+        hashes = _repository_hashes(_pypads_env.pypads.uri)
+        if key in hashes:
+            hash_id = hashes[key]
+        else:
+            hash_id = self._repository_entry(ctx, mapping_data, _pypads_env, _logger_call)
+            hashes[key] = hash_id
+
+        # Create referencing object
+        eto = EstimatorTO(repository_reference=hash_id, repository_type=_pypads_env.pypads.estimator_repository.name,
+                          parent=_logger_output, additional_data=mapping_data)
+
+        # Store object
+        _logger_output.estimator = eto.store()
+        _pypads_env.pypads.cache.run_add("estimators", {key: (eto, _logger_output.estimator)})
+        _pypads_env.pypads.api.register_teardown_utility("estimator_inits", _store_estimator_inits,
+                                                         order=TMP_TEARDOWN_ORDER)
+
+    @staticmethod
+    def _repository_entry(ctx, mapping_data, _pypads_env, _logger_call):
+        """
+        Adds the estimator to the estimator repository if it isn't known yet.
+        :return: Hash identifying the estimator in the repository
+        """
         estimator_data = data_str(mapping_data, "estimator", "@schema", default={})
 
         # Create repository object
@@ -142,10 +214,4 @@ class EstimatorILF(InjectionLogger):
         if not _pypads_env.pypads.estimator_repository.has_object(uid=hash_id):
             repo_obj = _pypads_env.pypads.estimator_repository.get_object(uid=hash_id)
             repo_obj.log_json(ero)
-
-        # Create referencing object
-        eto = EstimatorTO(repository_reference=hash_id, repository_type=_pypads_env.pypads.estimator_repository.name,
-                          parent=_logger_output, additional_data=mapping_data)
-
-        # Store object
-        _logger_output.estimator = eto.store()
+        return hash_id
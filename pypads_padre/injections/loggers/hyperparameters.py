@@ -1,41 +1,54 @@
 import sys
 
+from pypads import logger
 from pypads.app.injections.injection import InjectionLogger
 from pypads.app.env import InjectionLoggerEnv
 
 
 class HyperParameters(InjectionLogger):
+    """
+    Function logging the local variables of a function defining hyperparameters.
+
+    The function is executed once. A profile hook waits for the frame of the function to be entered and removes itself
+    right away, the locals are read from that frame after the function returned.
+    """
 
     def __call_wrapped__(self, ctx, *args, _pypads_env: InjectionLoggerEnv, _args, _kwargs, **_pypads_hook_params):
         from pypads.app.pypads import get_current_pads
         pads = get_current_pads()
 
-        def tracer(frame, event, arg):
-            if event == 'return':
-                params = frame.f_locals.copy()
-                key = str(self)
-                from pypads.app.pypads import get_current_pads
-                pads = get_current_pads()
-                pads.cache.run_add(key, params)
-
         fn = _pypads_env.callback
         if _pypads_env.call.call_id.is_wrapped():
             fn = _pypads_env.callback.__wrapped__
-        try:
+        code = getattr(fn, "__code__", None)
 
-            # tracer is activated on next call, return or exception
-            sys.setprofile(tracer)
-            fn(*_args, **_kwargs)
-        finally:
-            # deactivate tracer
-            sys.setprofile(None)
-        _return = super().__call_wrapped__(ctx, _pypads_env=_pypads_env, _args=_args, _kwargs=_kwargs, **_pypads_hook_params)
+        frames = []
+        previous = sys.getprofile()
 
+        def hook(frame, event, arg):
+            if event == 'call' and frame.f_code is code:
+                frames.append(frame)
+                sys.setprofile(previous)
+
+        if code is not None:
+            sys.setprofile(hook)
+        try:
+            _return = super().__call_wrapped__(ctx, _pypads_env=_pypads_env, _args=_args, _kwargs=_kwargs,
+                                               **_pypads_hook_params)
+        finally:
+            if sys.getprofile() is hook:
+                sys.setprofile(previous)
+
+        if len(frames) > 0:
+            # The frame holds the final values of the locals after the return
+            pads.cache.run_add(str(self), dict(frames.pop().f_locals))
+        else:
+            logger.warning("Couldn't capture the hyperparameters of {}.".format(getattr(fn, "__name__", fn)))
         return _return
 
     def __post__(self, ctx, *args, **kwargs):
         from pypads.app.pypads import get_current_pads
         pads = get_current_pads()
-        params = pads.cache.run_get(str(self))
+        params = pads.cache.run_pop(str(self)) or {}
         for key, param in params.items():
             pads.api.log_param(key, param)
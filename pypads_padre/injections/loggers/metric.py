@@ -1,42 +1,315 @@
-from typing import Union
+import os
+import time
+import uuid
+from typing import List, Type
 
+from pydantic import BaseModel
+from pypads import logger
 from pypads.importext.versioning import LibSelector
 from pypads.injections.loggers.metric import MetricILF, MetricTO
-from pypads.model.logger_output import MetricMetaModel
+from pypads.model.models import IdReference
+from pypads.utils.logging_util import data_path
 
+from pypads_padre.concepts.metrics import MetricWindow, MetricPointFile
+from pypads_padre.util import TMP_TEARDOWN_ORDER
 
-class MetricTorch(MetricILF):
+# Maximal number of metrics mlflow accepts in a single batch
+MLFLOW_MAX_BATCH = 1000
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+class AggregatedMetricTO(MetricTO):
     """
-    Function logging wrapped metrics of PyTroch
+    Tracking object for a metric of which only aggregates over windows of its points are logged.
     """
 
-    supported_libraries = {LibSelector(name="torch", constraint="*", specificity=1)}
+    class AggregatedMetricTOModel(MetricTO.MetricTOModel):
+        type: str = "AggregatedMetric"
+        metric: IdReference = None  # Reference to the artifact holding every point if they were kept
+        window: str = None  # Aggregation of the points logged to the tracking backend
+        keys: List[str] = []  # Keys of the metrics logged to the tracking backend
+        number_of_points: int = 0
+        number_of_windows: int = 0
 
-    _dependencies = {"torch"}
+    @classmethod
+    def get_model_cls(cls) -> Type[BaseModel]:
+        return cls.AggregatedMetricTOModel
+
+
+class MetricStream:
+    """
+    Host side stream of the points of a metric. The aggregates of closed windows are written to the tracking backend in
+    batches, every point is appended to a local point file if exact is set.
+    """
+
+    def __init__(self, to: AggregatedMetricTO, window: MetricWindow, exact=False):
+        self.to = to
+        self.window = window
+        self.points = None
+        if exact:
+            from pypads.utils.logging_util import get_temp_folder
+            self.points = MetricPointFile(os.path.join(get_temp_folder(), "metric_{}.points".format(uuid.uuid4())))
+        to.window = str(window)
+        to.keys = [self.key(a) for a in window.aggregates]
+
+    def key(self, aggregate):
+        if not self.window.aggregating:
+            return self.to.name
+        return "{}.{}".format(self.to.name, aggregate)
+
+    def _log(self, pads, windows):
+        if len(windows) == 0:
+            return
+        from mlflow.entities import Metric
+        metrics = [Metric(self.key(a), v, w["timestamp"], w["step"]) for w in windows for a, v in w["values"].items()]
+        run_id = pads.api.active_run().info.run_id
+        for start in range(0, len(metrics), MLFLOW_MAX_BATCH):
+            pads.backend.mlf.log_batch(run_id, metrics=metrics[start:start + MLFLOW_MAX_BATCH])
+        self.to.number_of_windows += len(windows)
+
+    def add(self, pads, steps, values, timestamps):
+        """
+        Adds points to the metric.
+        :param pads: Current pypads app
+        :param steps: Steps of the points
+        :param values: Host values of the points
+        :param timestamps: Timestamps of the points in milliseconds
+        """
+        self.to.number_of_points += len(steps)
+        if self.points is not None:
+            self.points.append(steps, values, timestamps)
+        self._log(pads, self.window.add(steps, values, timestamps))
+
+    def close(self, pads):
+        """
+        Logs the open window and stores the point file and the tracked object.
+        :return: Reference to the stored tracked object
+        """
+        window = self.window.close()
+        if window is not None:
+            self._log(pads, [window])
+        if self.points is not None and self.points.number_of_points > 0:
+            if not os.path.exists(self.points.path):
+                logger.warning("The point file of metric {} is missing. Only its logged values are kept."
+                               .format(self.to.name))
+            else:
+                try:
+                    self.to.as_artifact = True
+                    self.to.metric = self.to.store_artifact(self.points.path, None,
+                                                            description="Every point of the metric {}".format(
+                                                                self.to.name))
+                finally:
+                    os.remove(self.points.path)
+        return self.to.store()
+
+
+class MetricBuffer:
+    """
+    Buffer of the values of a scalar metric tensor. Values are copied into a preallocated tensor on the device of the
+    metric, such that logging them doesn't synchronize with the device. They are converted to host values at once when
+    the buffer is flushed into the stream of the metric.
+    """
+
+    def __init__(self, stream: MetricStream, size=100):
+        self.stream = stream
+        self.size = size
+        self.values = None
+        self.steps = []
+        self.timestamps = []
+        self.epoch_indices = None
+
+    @property
+    def full(self):
+        return len(self.steps) >= self.size
+
+    def add(self, value, step):
+        """
+        Adds a scalar metric tensor.
+        :param value: Scalar tensor
+        :param step: Step of the value
+        """
+        import torch
+        with torch.no_grad():
+            if self.values is None:
+                self.values = torch.empty(self.size, dtype=value.dtype, device=value.device)
+            self.values[len(self.steps)].copy_(value.detach().reshape(()))
+        self.steps.append(step)
+        self.timestamps.append(_now())
+
+    def flush(self, pads):
+        """
+        Converts the buffered values to host values and adds them to the stream of the metric.
+        :param pads: Current pypads app
+        :return: True if values were flushed
+        """
+        if len(self.steps) == 0:
+            return False
+        values = self.values[:len(self.steps)].cpu().tolist()
+        steps, timestamps, self.steps, self.timestamps = self.steps, self.timestamps, [], []
+        self.stream.add(pads, steps, values, timestamps)
+        return True
+
+
+def _close_metric_streams(pads, *args, **kwargs):
+    for buffer in (pads.cache.run_get("metric_buffers") or {}).values():
+        try:
+            buffer.flush(pads)
+        except Exception as e:
+            logger.warning("Couldn't flush the buffered values of metric {} because {}".format(buffer.stream.to.name,
+                                                                                               str(e)))
+    for stream in (pads.cache.run_get("metric_streams") or {}).values():
+        try:
+            stream.close(pads)
+        except Exception as e:
+            logger.warning("Couldn't close the stream of metric {} because {}".format(stream.to.name, str(e)))
 
-    def __init__(self,*args, **kwargs):
+
+class AggregatedMetricILF(MetricILF):
+    """
+    Function logging wrapped metrics. By default every call is logged by the MetricILF of pypads. Pass window_steps
+    points or window_seconds seconds (hook parameters) to aggregate high frequency metrics over windows instead. Only
+    the aggregates (mean, min, max, last or count) of each window are written to the tracking backend as
+    <metric>.<aggregate> then. Set exact=True to additionally keep every point in an append-only local file which is
+    stored as artifact at the end of the run.
+    """
+
+    def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.identity = MetricILF.__name__
 
+    @staticmethod
+    def _stream(pads, ctx, _pypads_env, _logger_output, window_steps=None, window_seconds=None,
+                aggregates=("mean", "min", "max", "last"), exact=False):
+        name = data_path(_pypads_env.data, "metric", "@schema", "rdfs:label",
+                         default=".".join([_logger_output.producer.original_call.call_id.context.container.__name__,
+                                           _logger_output.producer.original_call.call_id.wrappee.__name__]))
+        streams = pads.cache.run_get("metric_streams") or {}
+        if name not in streams:
+            try:
+                window = MetricWindow(steps=window_steps, seconds=window_seconds,
+                                      aggregates=aggregates if window_steps or window_seconds else ["last"])
+            except ValueError as e:
+                logger.warning("Logging every point of metric {}. {}".format(name, str(e)))
+                window = MetricWindow(aggregates=["last"])
+            to = AggregatedMetricTO(name=name, description=data_path(_pypads_env.data, "metric", "@schema",
+                                                                     "rdfs:comment",
+                                                                     default=getattr(ctx, "__doc__",
+                                                                                     "No description found.")),
+                                    documentation=data_path(_pypads_env.data, "metric", "@schema",
+                                                            "padre:documentation", default=ctx.__doc__),
+                                    additional_data=_pypads_env.data, parent=_logger_output)
+            streams[name] = MetricStream(to, window, exact=exact)
+            pads.cache.run_add("metric_streams", {name: streams[name]})
+            # Point files are stored before the temporary folder of the run is removed
+            pads.api.register_teardown_utility("metric_streams_close", _close_metric_streams, order=TMP_TEARDOWN_ORDER)
+        return streams[name]
+
+    @staticmethod
+    def _aggregating(window_steps=None, window_seconds=None, exact=False, **kwargs):
+        """
+        Checks if the aggregation of the metric was opted into by the hook parameters.
+        """
+        return bool(window_steps or window_seconds or exact)
+
+    @staticmethod
+    def _step(_pypads_env, _logger_call):
+        return data_path(_pypads_env.data, "metric", "@schema", "step",
+                         default=_logger_call.original_call.call_id.call_number)
+
+    def __post__(self, ctx, *args, _pypads_artifact_fallback=False, _pypads_env, _logger_call, _logger_output,
+                 _pypads_result, window_steps=None, window_seconds=None, aggregates=("mean", "min", "max", "last"),
+                 exact=False, **kwargs):
+        """
+        :param _pypads_artifact_fallback: Write to artifact if metric can not be logged as an double value into mlflow
+        :param window_steps: Number of points aggregated in a window. None to not aggregate by steps.
+        :param window_seconds: Number of seconds aggregated in a window. None to not aggregate by time.
+        :param aggregates: Aggregates of a window written to the tracking backend
+        :param exact: Keep every point in a local file stored as artifact
+        """
+        result = _pypads_result
+        if not isinstance(result, float) or not self._aggregating(window_steps, window_seconds, exact):
+            super().__post__(ctx, *args, _pypads_env=_pypads_env, _pypads_artifact_fallback=_pypads_artifact_fallback,
+                             _logger_call=_logger_call, _logger_output=_logger_output, _pypads_result=result,
+                             **kwargs)
+            return
+
+        from pypads.app.pypads import get_current_pads
+        pads = get_current_pads()
+        stream = self._stream(pads, ctx, _pypads_env, _logger_output, window_steps=window_steps,
+                              window_seconds=window_seconds, aggregates=aggregates, exact=exact)
+        stream.add(pads, [self._step(_pypads_env, _logger_call)], [result], [_now()])
+
+
+class MetricSklearn(AggregatedMetricILF):
+    """
+    Function logging wrapped metrics of sklearn.
+    """
+
+    supported_libraries = {LibSelector(name="sklearn", constraint="*", specificity=1)}
+
+
+class MetricTorch(AggregatedMetricILF):
+    """
+    Function logging wrapped metrics of PyTroch
+
+    Scalar metric tensors (e.g. the loss of every batch) are buffered on their device and logged every flush_every
+    (hook parameter) values, when a new epoch starts or when the run ends. This avoids synchronizing with the device by
+    calling item() on every step. The tracked object of the metric is stored on every flush. Set flush_every=1 to log
+    every value right away.
+    """
+
+    supported_libraries = {LibSelector(name="torch", constraint="*", specificity=1)}
+
+    _dependencies = {"torch"}
+
     def __post__(self, ctx, *args, _pypads_artifact_fallback=False, _pypads_env, _logger_call, _logger_output,
-                 _pypads_result,
-                 **kwargs):
+                 _pypads_result, flush_every=100, window_steps=None, window_seconds=None,
+                 aggregates=("mean", "min", "max", "last"), exact=False, **kwargs):
         """
         :param ctx:
         :param args:
         :param _pypads_artifact_fallback: Write to artifact if metric can not be logged as an double value into mlflow
         :param _pypads_result:
+        :param flush_every: Number of values buffered before they are added to the aggregation
         :param kwargs:
         :return:
         """
         result = _pypads_result
+        windowing = dict(window_steps=window_steps, window_seconds=window_seconds, aggregates=aggregates,
+                         exact=exact)
 
         if result is not None:
             from torch import Tensor
             if isinstance(result, Tensor):
-                super().__post__(ctx, *args, _pypads_env=_pypads_env,_pypads_artifact_fallback=_pypads_artifact_fallback,
-                                 _logger_call=_logger_call, _logger_output=_logger_output,
-                                 _pypads_result=result.item(), **kwargs)
+                if flush_every is None or flush_every <= 1 or result.numel() != 1:
+                    super().__post__(ctx, *args, _pypads_env=_pypads_env,
+                                     _pypads_artifact_fallback=_pypads_artifact_fallback,
+                                     _logger_call=_logger_call, _logger_output=_logger_output,
+                                     _pypads_result=result.item(), **windowing, **kwargs)
+                    return
+
+                from pypads.app.pypads import get_current_pads
+                pads = get_current_pads()
+                buffers = pads.cache.run_get("metric_buffers") or {}
+                stream = self._stream(pads, ctx, _pypads_env, _logger_output, **windowing)
+                buffer = buffers.get(stream.to.name)
+                if buffer is None:
+                    buffer = MetricBuffer(stream, size=flush_every)
+                    pads.cache.run_add("metric_buffers", {stream.to.name: buffer})
+
+                # The values of a finished epoch are flushed when the data loader starts a new one
+                order = pads.cache.run_get("epoch_order")
+                if order is not None and order["indices"] is not buffer.epoch_indices:
+                    buffer.epoch_indices = order["indices"]
+                    if buffer.flush(pads):
+                        _logger_output.metric = stream.to.store()
+
+                buffer.add(result, step=self._step(_pypads_env, _logger_call))
+                if buffer.full and buffer.flush(pads):
+                    _logger_output.metric = stream.to.store()
             # else:
             #     from torch.optim.optimizer import Optimizer
             #     if isinstance(ctx, Optimizer):
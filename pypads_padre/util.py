@@ -3,6 +3,10 @@ from types import ModuleType
 
 from typing import Tuple
 
+# Order of the teardown functions still writing into the temporary folder of a run. They have to run before pypads
+# removes the folder in its teardown of order 0.
+TMP_TEARDOWN_ORDER = -1
+
 
 def get_class_that_defined_method(meth):
     if inspect.ismethod(meth):
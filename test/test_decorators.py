@@ -2,6 +2,14 @@ from pypads_padre.concepts.util import persistent_hash
 from test.base_test import BaseTest, TEST_FOLDER
 
 
+def nearest_centroid_fold(X, y, train_idx, test_idx, val_idx):
+    import numpy as np
+    classes = np.unique(y[train_idx])
+    centroids = np.stack([X[train_idx][y[train_idx] == c].mean(axis=0) for c in classes])
+    distances = ((X[test_idx][:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+    return {"predictions": classes[distances.argmin(axis=1)]}
+
+
 class PyPadsDecoratorsTest(BaseTest):
 
     def test_dataset(self):
@@ -154,6 +162,451 @@ class PyPadsDecoratorsTest(BaseTest):
         # !-------------------------- asserts ---------------------------
         tracker.api.end_run()
 
+    def test_split_repository(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(uri=TEST_FOLDER, autostart=True)
+
+        @tracker.decorators.dataset(name="iris")
+        def load_iris():
+            from sklearn.datasets import load_iris
+            return load_iris()
+
+        data = load_iris()
+
+        split_ids = []
+        for _ in range(2):
+            for train_idx, test_idx, val_idx in tracker.actuators.default_splitter(data.data, strategy="cv",
+                                                                                  n_folds=3, random_seed=1):
+                split_ids.append(tracker.cache.run_get("current_split"))
+
+        # --------------------------- asserts ---------------------------
+        import numpy
+        # Identical seeded splits share the same content addressed id
+        self.assertEqual(split_ids[:3], split_ids[3:])
+        for split_id in split_ids[:3]:
+            self.assertTrue(tracker.split_repository.has_object(uid=split_id))
+
+        train_idx, test_idx, val_idx = tracker.results.get_split(split_ids[0])
+        first_train, first_test, _ = next(tracker.actuators.default_splitter(data.data, strategy="cv", n_folds=3,
+                                                                             random_seed=1))
+        self.assertTrue(numpy.array_equal(train_idx, first_train))
+        self.assertTrue(numpy.array_equal(test_idx, first_test))
+
+        # The stored splits keep their index sets and resolve to the same indices out of the repository
+        splits = tracker.cache.run_get("split_tracker")
+        tracker.api.end_run()
+        for split_id in split_ids[:3]:
+            split = splits.splits[split_id]
+            self.assertEqual(split.repository_reference, split_id)
+            train_idx, test_idx, val_idx = tracker.results.get_split(split.repository_reference)
+            self.assertTrue(numpy.array_equal(train_idx, split.train_set))
+            self.assertTrue(numpy.array_equal(test_idx, split.test_set))
+            self.assertTrue(len(split.train_set) > 0 and len(split.test_set) > 0)
+        # !-------------------------- asserts ---------------------------
+
+    def test_split_leakage(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(uri=TEST_FOLDER, autostart=True)
+
+        @tracker.decorators.dataset(name="duplicated", output_format={'X': 'features', 'y': 'targets'})
+        def load_data():
+            import numpy as np
+            X = np.arange(40, dtype=float).reshape(20, 2)
+            X[15] = X[2]
+            X[16] = X[3]
+            y = np.zeros(20)
+            return X, y
+
+        @tracker.decorators.splitter()
+        def splitter(data):
+            import numpy as np
+            idx = np.arange(len(data))
+            return idx[:10], idx[10:]
+
+        X, y = load_data()
+        splitter(X)
+
+        # --------------------------- asserts ---------------------------
+        split_id = tracker.cache.run_get("current_split")
+        from pypads_padre.bindings.events import DEFAULT_PADRE_LOGGING_FNS
+        SplitILF = DEFAULT_PADRE_LOGGING_FNS["splits"][0]
+        split = tracker.cache.run_get(id(SplitILF)).get('output').splits.splits[str(split_id)]
+        self.assertEqual(split.test_train_duplicates, 2)
+        self.assertEqual(split.duplicate_instances, 2)
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_instance_ids(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(uri=TEST_FOLDER, autostart=True)
+
+        @tracker.decorators.dataset(name="keyed", instance_key=0)
+        def load_data():
+            import numpy as np
+            X = np.random.random((20, 3))
+            X[:, 0] = np.arange(100, 120)
+            return X
+
+        X = load_data()
+
+        # --------------------------- asserts ---------------------------
+        import numpy
+        from pypads_padre.concepts.hashing import dataset_instance_ids
+        ids = dataset_instance_ids(tracker)
+        self.assertTrue(numpy.array_equal(ids, X[:, 0]))
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_truncated_dataset_hashes(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(uri=TEST_FOLDER, autostart=True)
+
+        import numpy as np
+        X = np.random.random((5000, 3))
+        Y = X.copy()
+        Y[2500, 1] += 1
+
+        @tracker.decorators.dataset(name="large")
+        def load_data(data):
+            return data
+
+        # --------------------------- asserts ---------------------------
+        from pypads_padre.concepts.hashing import dataset_row_hashes, row_hashes
+        # The string representations of both datasets are truncated and equal
+        self.assertEqual(str(X), str(Y))
+        load_data(X)
+        self.assertTrue(np.array_equal(dataset_row_hashes(tracker), row_hashes(X)))
+        load_data(Y)
+        self.assertTrue(np.array_equal(dataset_row_hashes(tracker), row_hashes(Y)))
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_object_row_hashes(self):
+        import sys
+        from unittest import mock
+        import numpy as np
+        from pypads_padre.concepts.hashing import row_hashes
+        data = np.array([["a", 1], ["b", 2], ["a", 1]], dtype=object)
+
+        # --------------------------- asserts ---------------------------
+        # Mixed columns are hashed without pandas as well
+        with mock.patch.dict(sys.modules, {"pandas": None}):
+            hashes = row_hashes(data)
+        self.assertEqual(hashes.dtype, np.uint64)
+        self.assertEqual(hashes[0], hashes[2])
+        self.assertNotEqual(hashes[0], hashes[1])
+        # !-------------------------- asserts ---------------------------
+
+    def test_parallel_folds(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(uri=TEST_FOLDER, autostart=True)
+
+        @tracker.decorators.dataset(name="iris")
+        def load_iris():
+            from sklearn.datasets import load_iris
+            return load_iris()
+
+        data = load_iris()
+
+        results = tracker.actuators.parallel_folds(nearest_centroid_fold, data.data, data.target, n_jobs=2,
+                                                   strategy="cv", n_folds=3)
+
+        # --------------------------- asserts ---------------------------
+        self.assertEqual(len(results), 3)
+        splits = list(tracker.actuators.default_splitter(data.data, data.target, strategy="cv", n_folds=3))
+        for (train_idx, test_idx, _), result in zip(splits, results):
+            self.assertEqual(len(result["predictions"]), len(test_idx))
+        self.assertTrue(tracker.cache.run_exists("current_split"))
+
+        # The decisions computed in the worker processes are tracked for the split of their fold
+        import numpy
+        decided = tracker.cache.run_get("fold_decisions")
+        self.assertEqual(len(decided), 3)
+        for (_, test_idx, _), result, reference in zip(splits, results, decided.values()):
+            columns = tracker.results.get_decisions(reference)
+            self.assertTrue(numpy.array_equal(columns["instance"], test_idx))
+            self.assertTrue(numpy.array_equal(columns["prediction"], result["predictions"]))
+            self.assertTrue(numpy.array_equal(columns["truth"], data.target[test_idx]))
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_parallel_folds_cleanup(self):
+        import numpy as np
+        from multiprocessing import shared_memory
+        from pypads_padre.concepts.parallel import SharedArrays, execute_folds
+        X = np.random.random((30, 2))
+        y = np.arange(30) % 2
+        folds = [(np.arange(0, 20), np.arange(20, 30), None), (np.arange(10, 30), np.arange(0, 10), None)]
+
+        # --------------------------- asserts ---------------------------
+        # Stopping the iteration early releases the shared memory when the context is left
+        with SharedArrays(X, y) as shared:
+            names = [descriptor[1] for descriptor in shared.descriptors]
+            for result in execute_folds(nearest_centroid_fold, shared, folds, n_jobs=1):
+                self.assertEqual(len(result["predictions"]), 10)
+                break
+        for name in names:
+            self.assertRaises(FileNotFoundError, shared_memory.SharedMemory, name=name)
+
+        # An exception raised while the folds are consumed releases it as well
+        with self.assertRaises(ValueError):
+            with SharedArrays(X, y) as shared:
+                names = [descriptor[1] for descriptor in shared.descriptors]
+                raise ValueError("Stopping the folds")
+        for name in names:
+            self.assertRaises(FileNotFoundError, shared_memory.SharedMemory, name=name)
+        # !-------------------------- asserts ---------------------------
+
+    def test_columnar_decisions(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(uri=TEST_FOLDER, autostart=True)
+
+        import numpy
+        from pypads_padre.injections.loggers.decision_tracking import SingleInstanceTO
+        targets = numpy.array([0, 1, 1, 0, 2, 2])
+        test_idx = numpy.array([1, 3, 4])
+        decisions = SingleInstanceTO(split_id="split", parent=tracker.api.get_programmatic_output())
+        decisions.add_decisions(test_idx, numpy.array([1, 1, 2]), numpy.eye(3)[[1, 1, 2]], targets)
+
+        # --------------------------- asserts ---------------------------
+        self.assertEqual(decisions.number_of_decisions, 3)
+        self.assertEqual(decisions.number_of_classes, 3)
+        self.assertAlmostEqual(decisions.accuracy, 2 / 3)
+        self.assertEqual(decisions.columns, ["instance", "prediction", "truth", "probabilities"])
+        decisions.store()
+        columns = tracker.results.get_decisions(decisions.decisions_reference)
+        self.assertTrue(numpy.array_equal(columns["instance"], test_idx))
+        self.assertTrue(numpy.array_equal(columns["truth"], targets[test_idx]))
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_multiple_split_decisions(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(uri=TEST_FOLDER, autostart=True)
+
+        @tracker.decorators.dataset(name="iris", output_format={'X': 'features', 'y': 'targets'})
+        def load_iris():
+            from sklearn.datasets import load_iris
+            return load_iris(return_X_y=True)
+
+        X, y = load_iris()
+        for _ in tracker.actuators.default_splitter(X, strategy="cv", n_folds=3):
+            pass
+
+        from sklearn.tree import DecisionTreeClassifier
+        model = DecisionTreeClassifier().fit(X, y)
+        model.predict(X)
+        model.predict(X)
+
+        # --------------------------- asserts ---------------------------
+        # Every split is written exactly once for the same predictions
+        self.assertEqual(len(tracker.cache.run_get("decided_splits")), 3)
+
+        # Another estimator on the same splits writes its own decisions
+        from sklearn.neighbors import KNeighborsClassifier
+        other = KNeighborsClassifier(n_neighbors=15).fit(X, y)
+        other.predict(X)
+        decided = tracker.cache.run_get("decided_splits")
+        self.assertEqual(len(decided), 6)
+        self.assertEqual(len({split_id for split_id, *_ in decided}), 3)
+        self.assertEqual(len({estimator for _, estimator, *_ in decided}), 2)
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_encoded_probabilities(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(uri=TEST_FOLDER, autostart=True)
+
+        import numpy
+        from pypads_padre.concepts.decisions import ProbabilityEncoding
+        from pypads_padre.injections.loggers.decision_tracking import SingleInstanceTO
+        probabilities = numpy.random.dirichlet(numpy.ones(100), size=50)
+        decisions = SingleInstanceTO(split_id="split", parent=tracker.api.get_programmatic_output(),
+                                     encoding=ProbabilityEncoding("topk", top_k=3))
+        decisions.add_decisions(numpy.arange(50), probabilities.argmax(axis=1), probabilities)
+        decisions.store()
+
+        # --------------------------- asserts ---------------------------
+        columns = tracker.results.get_decisions(decisions.decisions_reference)
+        self.assertEqual(columns["probabilities"].shape, (50, 100))
+        self.assertTrue(numpy.array_equal(columns["probabilities"].argmax(axis=1), probabilities.argmax(axis=1)))
+        self.assertTrue(numpy.all(numpy.count_nonzero(columns["probabilities"], axis=1) == 3))
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_mapping_cache(self):
+        import tempfile
+        from pypads_padre.bindings.mapping_cache import default_mapping_paths, read_cache, load_mapping_file, \
+            LazyMappingFile
+        path = [p for p in default_mapping_paths() if p.endswith("torch_1_4_0.yml")][0]
+
+        # --------------------------- asserts ---------------------------
+        with tempfile.TemporaryDirectory() as folder:
+            self.assertIsNone(read_cache(path, folder))
+            parsed = load_mapping_file(path, folders=[folder], write_folder=folder)
+            cached = read_cache(path, folder)
+            self.assertEqual(cached.uid, parsed.uid)
+            self.assertEqual(cached.lib, parsed.lib)
+            self.assertEqual(len(cached._get_all_mappings()), len(parsed._get_all_mappings()))
+            # Caches of other file contents are invalid
+            self.assertIsNone(read_cache(path, folder, file_hash="outdated"))
+
+            # Lazy mapping files only load their mappings on lookup
+            lazy = LazyMappingFile(path, folders=[folder])
+            self.assertFalse(lazy.loaded)
+            self.assertEqual(lazy.lib, parsed.lib)
+            self.assertEqual(lazy.uid, parsed.uid)
+            self.assertEqual(len(lazy._get_all_mappings()), len(parsed._get_all_mappings()))
+            self.assertTrue(lazy.loaded)
+        # !-------------------------- asserts ---------------------------
+
+    def test_mapping_cache_config(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        from pypads_padre.bindings.mapping_cache import LazyMappingFile
+        tracker = PyPads(uri=TEST_FOLDER, config={"mapping_cache": False}, autostart=True)
+
+        # --------------------------- asserts ---------------------------
+        mapping_files = list(tracker.mapping_registry._mappings.values())
+        self.assertTrue(len(mapping_files) > 0)
+        self.assertFalse(any(isinstance(m, LazyMappingFile) for m in mapping_files))
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_mapping_trie(self):
+        from pypads.importext.mappings import MappingCollection
+        from pypads.importext.package_path import PackagePath
+        from pypads_padre.bindings.mapping_cache import default_mapping_paths, LazyMappingFile
+        path = [p for p in default_mapping_paths() if p.endswith("sklearn_0_19_1.yml")][0]
+        mapping = LazyMappingFile(path)
+
+        # --------------------------- asserts ---------------------------
+        for reference in ["sklearn.metrics.accuracy_score", "sklearn.metrics._private",
+                          "sklearn.tree.DecisionTreeClassifier.fit", "sklearn.model_selection.KFold.split",
+                          "sklearn.unknown.module"]:
+            segments = PackagePath(reference).segments
+            self.assertEqual({id(m) for m in mapping.find_mappings(segments)},
+                             {id(m) for m in MappingCollection.find_mappings(mapping, segments)})
+        # !-------------------------- asserts ---------------------------
+
+    def test_chunked_scoring(self):
+        import numpy
+        from pypads_padre.concepts.decisions import map_chunks
+        x = numpy.arange(1000).reshape(-1, 2)
+
+        # --------------------------- asserts ---------------------------
+        for n_jobs in [None, 4]:
+            chunks = list(map_chunks(lambda chunk: chunk.sum(axis=1), x, 64, n_jobs=n_jobs))
+            self.assertEqual([start for start, _ in chunks], list(range(0, 500, 64)))
+            self.assertTrue(numpy.array_equal(numpy.concatenate([scores for _, scores in chunks]), x.sum(axis=1)))
+        # !-------------------------- asserts ---------------------------
+
+    def test_typed_decisions(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(uri=TEST_FOLDER, autostart=True)
+
+        import numpy
+        from scipy.sparse import csr_matrix
+        from pypads_padre.injections.loggers.decision_tracking import SingleInstanceTO
+        regression = SingleInstanceTO(split_id="regression", parent=tracker.api.get_programmatic_output())
+        regression.add_decisions(numpy.arange(4), numpy.array([0.5, 1.5, 2.0, 3.0]),
+                                 targets=numpy.array([1.0, 1.0, 2.0, 3.0]))
+        labels = csr_matrix(numpy.array([[1, 0, 1], [0, 1, 0], [1, 1, 0]]))
+        multi_label = SingleInstanceTO(split_id="multi_label", parent=tracker.api.get_programmatic_output())
+        multi_label.add_decisions(numpy.arange(3), labels, targets=labels)
+        # Classes of a classifier trained on float labels
+        float_labels = SingleInstanceTO(split_id="float_labels", parent=tracker.api.get_programmatic_output(),
+                                        classifier=True)
+        float_labels.add_decisions(numpy.arange(4), numpy.array([0.0, 1.0, 1.0, 0.0]),
+                                   targets=numpy.array([0.0, 1.0, 0.0, 0.0]))
+
+        # --------------------------- asserts ---------------------------
+        self.assertEqual(regression.output_type, "regression")
+        self.assertAlmostEqual(regression.mean_absolute_error, 0.25)
+        self.assertEqual(float_labels.output_type, "classification")
+        self.assertEqual(float_labels.accuracy, 0.75)
+        self.assertEqual(float_labels.prediction_counts, {"0.0": 2, "1.0": 2})
+        self.assertIsNone(float_labels.mean_absolute_error)
+        self.assertEqual(multi_label.output_type, "multi_label")
+        self.assertEqual(multi_label.accuracy, 1.0)
+        self.assertEqual(multi_label.prediction_counts, {"0": 2, "1": 2, "2": 1})
+        multi_label.store()
+        columns = tracker.results.get_decisions(multi_label.decisions_reference)
+        self.assertEqual((columns["prediction"] != labels).nnz, 0)
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_sampled_decisions(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(uri=TEST_FOLDER, autostart=True)
+
+        import numpy
+        from pypads_padre.concepts.sampling import DecisionSampler
+        from pypads_padre.injections.loggers.decision_tracking import SingleInstanceTO
+        targets = numpy.random.randint(0, 3, 1000)
+        predictions = targets.copy()
+        predictions[:10] = (predictions[:10] + 1) % 3
+        decisions = SingleInstanceTO(split_id="split", parent=tracker.api.get_programmatic_output())
+        decisions.add_decisions(numpy.arange(1000), predictions, targets=targets,
+                                sampler=DecisionSampler("errors", size=20, seed=0))
+
+        # --------------------------- asserts ---------------------------
+        # Aggregates are exact, only 10 errors plus 20 correct decisions are stored
+        self.assertEqual(decisions.number_of_decisions, 1000)
+        self.assertEqual(decisions.number_of_errors, 10)
+        self.assertEqual(sum(decisions.prediction_counts.values()), 1000)
+        self.assertEqual(decisions.number_of_stored_decisions, 30)
+        decisions.store()
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_stratified_decisions(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(uri=TEST_FOLDER, autostart=True)
+
+        import numpy
+        from pypads_padre.concepts.sampling import DecisionSampler
+        from pypads_padre.injections.loggers.decision_tracking import SingleInstanceTO
+        predictions = numpy.repeat([0, 1, 2], [80, 15, 5])
+        by_size = SingleInstanceTO(split_id="size", parent=tracker.api.get_programmatic_output())
+        by_size.add_decisions(numpy.arange(100), predictions, sampler=DecisionSampler("stratified", size=10, seed=0))
+        by_size.store()
+        by_rate = SingleInstanceTO(split_id="rate", parent=tracker.api.get_programmatic_output())
+        by_rate.add_decisions(numpy.arange(100), predictions, sampler=DecisionSampler("stratified", rate=0.05, seed=0))
+        by_rate.store()
+
+        # --------------------------- asserts ---------------------------
+        # Exactly size decisions are kept, at least one of each class
+        stored = tracker.results.get_decisions(by_size.decisions_reference)["prediction"]
+        self.assertEqual(list(numpy.bincount(stored)), [7, 2, 1])
+        stored = tracker.results.get_decisions(by_rate.decisions_reference)["prediction"]
+        self.assertEqual(list(numpy.bincount(stored)), [4, 1, 1])
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
     # def test_track(self):
     #     # --------------------------- setup of the tracking ---------------------------
     #     # Activate tracking of pypads
@@ -97,3 +97,45 @@ class PypadsKerasTest(BaseTest):
         # TODO Add asserts
         # !-------------------------- asserts ---------------------------
         tracker.api.end_run()
+
+    def test_keras_predict_classes_decisions(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        from pypads.bindings import events, hooks
+        from test.base_test import RunLogger
+        run_logger = RunLogger()
+        tracker = PyPads(hooks={**hooks.DEFAULT_HOOK_MAPPING, "run_logger": {"on": ["pypads_predict"]}},
+                         events={**events.DEFAULT_LOGGING_FNS, "run_logger": [run_logger]},
+                         autostart="KerasDecisions")
+
+        import numpy as np
+        from keras.models import Sequential
+        from keras.layers import Dense
+
+        X = np.random.random((100, 8))
+        y = np.random.randint(2, size=100)
+        model = Sequential()
+        model.add(Dense(4, input_dim=8, activation='relu'))
+        model.add(Dense(1, activation='sigmoid'))
+        model.compile(loss='binary_crossentropy', optimizer='adam')
+        model.fit(X, y, epochs=1, batch_size=10, verbose=0)
+
+        # Count the passes over the network
+        calls = []
+        predict = model.predict
+
+        def counting_predict(*args, **kwargs):
+            calls.append(kwargs.get("batch_size"))
+            return predict(*args, **kwargs)
+
+        model.predict = counting_predict
+        classes = model.predict_classes(X, batch_size=25)
+
+        # --------------------------- asserts ---------------------------
+        self.assertEqual(calls, [25])
+        self.assertTrue(np.array_equal(classes, (predict(X) > 0.5).astype('int32')))
+        self.assertEqual(tracker.cache.run_get(id(run_logger)), 1)
+        self.assertFalse(tracker.cache.run_exists("predictions"))
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
@@ -152,4 +152,240 @@ class PyPadsTest(BaseSklearnTest):
 
         # --------------------------- asserts ---------------------------
         # TODO Add asserts
-        # !-------------------------- asserts ---------------------------
\ No newline at end of file
+        # !-------------------------- asserts ---------------------------
+
+    def test_single_inference_decisions(self):
+        """
+        This example will track the predictions of a classifier derived from a single inference.
+        :return:
+        """
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(autostart=True)
+
+        import numpy
+        from sklearn import datasets
+        from sklearn.linear_model import LogisticRegression
+
+        X, y = datasets.load_iris(return_X_y=True)
+        model = LogisticRegression(max_iter=1000)
+        model.fit(X, y)
+
+        # Count the inferences of the estimator. predict of LogisticRegression calls decision_function.
+        calls = {"predict_proba": 0, "decision_function": 0}
+
+        def counting(name):
+            fn = getattr(model, name)
+
+            def count(*args, **kwargs):
+                calls[name] += 1
+                return fn(*args, **kwargs)
+
+            return count
+
+        model.predict_proba = counting("predict_proba")
+        model.decision_function = counting("decision_function")
+        predicted = model.predict(X)
+
+        # --------------------------- asserts ---------------------------
+        self.assertEqual(calls, {"predict_proba": 1, "decision_function": 0})
+        self.assertTrue(numpy.array_equal(predicted, model.classes_[model.predict_proba(X).argmax(axis=1)]))
+        self.assertFalse(tracker.cache.run_exists("single_inference"))
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_single_inference_subclass(self):
+        from sklearn.linear_model import LogisticRegression
+        from pypads_padre.injections.loggers.decision_tracking import DecisionsSklearnILF
+
+        class CustomRegression(LogisticRegression):
+            def predict(self, X):
+                return super().predict(X)
+
+        LogisticRegressionCV = type("LogisticRegressionCV", (object,), {})
+
+        # --------------------------- asserts ---------------------------
+        # Only classes defined by sklearn itself derive their predictions from a single inference
+        self.assertEqual(DecisionsSklearnILF._sklearn_name(LogisticRegression()), "LogisticRegression")
+        self.assertIsNone(DecisionsSklearnILF._sklearn_name(CustomRegression()))
+        self.assertIsNone(DecisionsSklearnILF._sklearn_name(LogisticRegressionCV()))
+        # !-------------------------- asserts ---------------------------
+
+    def test_stacked_predict_loggers(self):
+        """
+        This example will run another logger hooked on predict next to the decisions logger replacing the inference.
+        :return:
+        """
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        from pypads.bindings import events, hooks
+        from test.base_test import RunLogger
+        run_logger = RunLogger()
+        tracker = PyPads(hooks={**hooks.DEFAULT_HOOK_MAPPING, "run_logger": {"on": ["pypads_predict"]}},
+                         events={**events.DEFAULT_LOGGING_FNS, "run_logger": [run_logger]}, autostart=True)
+
+        import numpy
+        from sklearn import datasets
+        from sklearn.linear_model import LogisticRegression
+
+        X, y = datasets.load_iris(return_X_y=True)
+        model = LogisticRegression(max_iter=1000)
+        model.fit(X, y)
+        predicted = model.predict(X)
+        model.predict(X[:10])
+
+        # --------------------------- asserts ---------------------------
+        self.assertTrue(numpy.array_equal(predicted, model.classes_[model.predict_proba(X).argmax(axis=1)]))
+        self.assertEqual(tracker.cache.run_get(id(run_logger)), 2)
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_chunked_scoring(self):
+        """
+        This example will derive the predictions of a classifier from scores computed chunk by chunk.
+        :return:
+        """
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        from pypads.bindings import hooks
+        tracker = PyPads(hooks={**hooks.DEFAULT_HOOK_MAPPING,
+                                "predictions": {"on": ["pypads_predict"], "with": {"chunk_size": 20}}},
+                         autostart=True)
+
+        import numpy
+        from sklearn import datasets
+        from sklearn.linear_model import LogisticRegression
+
+        X, y = datasets.load_iris(return_X_y=True)
+        model = LogisticRegression(max_iter=1000)
+        model.fit(X, y)
+        expected = model.predict(X[:10])
+
+        calls = {"predict_proba": 0, "decision_function": 0}
+
+        def counting(name):
+            fn = getattr(model, name)
+
+            def count(*args, **kwargs):
+                calls[name] += 1
+                return fn(*args, **kwargs)
+
+            return count
+
+        model.predict_proba = counting("predict_proba")
+        model.decision_function = counting("decision_function")
+
+        # Without a split the scores of each chunk are only used to derive its predictions
+        predicted = model.predict(X)
+        chunks = calls["predict_proba"]
+
+        # The scores of the test set of the current split are streamed into its decisions
+        for train_idx, test_idx, val_idx in tracker.actuators.default_splitter(X):
+            test_predicted = model.predict(X[test_idx])
+
+        # --------------------------- asserts ---------------------------
+        self.assertEqual(chunks, 8)
+        self.assertEqual(calls["decision_function"], 0)
+        self.assertEqual(calls["predict_proba"], 8 + (len(test_idx) + 19) // 20)
+        self.assertTrue(numpy.array_equal(predicted[:10], expected))
+        proba = model.classes_[model.predict_proba(X).argmax(axis=1)]
+        self.assertTrue(numpy.array_equal(predicted, proba))
+        self.assertTrue(numpy.array_equal(test_predicted, proba[test_idx]))
+        for key in ["probabilities", "predictions", "streamed_decisions", "chunked_inference"]:
+            self.assertFalse(tracker.cache.run_exists(key))
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_estimator_clones(self):
+        """
+        This example will track repeated inits of an estimator as a single estimator with a counter.
+        :return:
+        """
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(autostart=True)
+
+        from sklearn.base import clone
+        from sklearn.tree import DecisionTreeClassifier
+
+        model = DecisionTreeClassifier()
+        for _ in range(5):
+            clone(model)
+
+        # --------------------------- asserts ---------------------------
+        estimators = [eto for (cls, _), (eto, _) in tracker.cache.run_get("estimators").items()
+                      if cls is DecisionTreeClassifier]
+        self.assertEqual(len(estimators), 1)
+        self.assertEqual(estimators[0].number_of_inits, 6)
+
+        # The repository hashes are keyed by the class and the stable hash of its mappings for the current uri only
+        from pypads_padre.injections.loggers.estimator import _estimator_hashes, _repository_hashes
+        self.assertEqual(list(_estimator_hashes.keys()), [tracker.uri])
+        keys = [key for key in _estimator_hashes[tracker.uri] if key[0] is DecisionTreeClassifier]
+        self.assertEqual(keys, [key for key in tracker.cache.run_get("estimators") if key[0] is DecisionTreeClassifier])
+        self.assertEqual(len(_repository_hashes("other")), 0)
+        self.assertNotIn(tracker.uri, _estimator_hashes)
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_nested_metrics(self):
+        """
+        This example will only track the outermost metric if metrics call each other.
+        :return:
+        """
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(autostart=True)
+
+        from sklearn.metrics import f1_score
+        score = f1_score([0, 1, 1, 0, 1], [0, 1, 0, 0, 1])
+
+        # --------------------------- asserts ---------------------------
+        # Metrics are logged per call by the metric logger of pypads if their aggregation isn't requested
+        run_id = tracker.api.active_run().info.run_id
+        metrics = tracker.backend.mlf.get_run(run_id).data.metrics
+        self.assertEqual(len(metrics), 1)
+        name, = metrics.keys()
+        self.assertEqual([m.value for m in tracker.backend.mlf.get_metric_history(run_id, name)], [score])
+        self.assertFalse(tracker.cache.run_exists("metric_streams"))
+        self.assertAlmostEqual(score, 0.8)
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_exact_metrics(self):
+        """
+        This example will aggregate a metric over windows and store its points when the run ends.
+        :return:
+        """
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        import os
+        from pypads.app.base import PyPads
+        from pypads.bindings import hooks
+        tracker = PyPads(hooks={**hooks.DEFAULT_HOOK_MAPPING,
+                                "metric": {"on": ["pypads_metric"], "with": {"window_steps": 2, "exact": True}}},
+                         autostart=True)
+
+        from sklearn.metrics import accuracy_score
+        for i in range(3):
+            accuracy_score([0, 1, 1, 0], [0, 1, 1, i % 2])
+        stream, = tracker.cache.run_get("metric_streams").values()
+        path = stream.points.path
+        run_id = tracker.api.active_run().info.run_id
+        tracker.api.end_run()
+
+        # --------------------------- asserts ---------------------------
+        # The open window and the point file are stored before the temporary folder is removed
+        self.assertEqual(stream.to.number_of_points, 3)
+        self.assertEqual(stream.to.number_of_windows, 2)
+        self.assertTrue(stream.to.as_artifact)
+        self.assertIsNotNone(stream.to.metric)
+        self.assertFalse(os.path.exists(path))
+        means = tracker.backend.mlf.get_metric_history(run_id, stream.to.name + ".mean")
+        self.assertEqual(len(means), 2)
+        # !-------------------------- asserts ---------------------------
@@ -34,3 +34,264 @@ class PyPadsTorchTest(BaseTest):
         # --------------------------- asserts ---------------------------
         # TODO Add asserts
         # !-------------------------- asserts ---------------------------
+
+    def test_epoch_order(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(autostart=True)
+
+        import numpy as np
+        import torch
+        from torch.utils.data import DataLoader, TensorDataset
+        loader = DataLoader(TensorDataset(torch.arange(50)), batch_size=8, shuffle=True, num_workers=2,
+                            persistent_workers=True)
+
+        # --------------------------- asserts ---------------------------
+        orders = []
+        for _ in range(2):
+            served = np.concatenate([batch[0].numpy() for batch in loader])
+            order = tracker.cache.run_get("epoch_order")
+            self.assertEqual(list(order["indices"]), list(served))
+            self.assertEqual(list(order["offsets"]), [8, 16, 24, 32, 40, 48, 50])
+            orders.append(order["indices"])
+        # Every epoch of the persistent workers is captured on its own
+        self.assertIsNot(orders[0], orders[1])
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_epoch_decisions(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(autostart=True)
+
+        import numpy as np
+        import torch
+        from torch.utils.data import DataLoader, TensorDataset
+
+        class Net(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.linear = torch.nn.Linear(4, 3)
+
+            def forward(self, x):
+                return self.linear(x)
+
+        Net = tracker.api.track_model(Net, fn_anchors={"forward": ["pypads_predict"]})
+        model = Net()
+        model.eval()
+        loader = DataLoader(TensorDataset(torch.arange(50), torch.randn(50, 4)), batch_size=8, shuffle=True)
+
+        def epoch(batches):
+            decisions, indices, predictions = None, [], []
+            with torch.no_grad():
+                for i, (index, x) in enumerate(loader):
+                    if i == batches:
+                        break
+                    predictions.append(model(x).numpy().argmax(axis=1))
+                    indices.append(index.numpy())
+                    if decisions is None:
+                        decisions = tracker.cache.run_get("decision_accumulator").decisions
+            return decisions, np.concatenate(indices), np.concatenate(predictions)
+
+        # A complete epoch is stored right away, the decisions of an interrupted one when the run ends
+        full, full_indices, full_predictions = epoch(None)
+        partial, partial_indices, partial_predictions = epoch(3)
+        run_id = tracker.api.active_run().info.run_id
+        tracker.api.end_run()
+
+        # --------------------------- asserts ---------------------------
+        self.assertEqual(full.number_of_decisions, 50)
+        self.assertEqual(partial.number_of_decisions, 24)
+        for to, indices, predictions in [(full, full_indices, full_predictions),
+                                         (partial, partial_indices, partial_predictions)]:
+            decisions = tracker.results.get_decisions(to.decisions_reference, run_id=run_id)
+            self.assertEqual(list(decisions["instance"]), list(indices))
+            self.assertEqual(list(decisions["prediction"]), list(predictions))
+        # !-------------------------- asserts ---------------------------
+
+    def test_parameter_summary(self):
+        import torch
+        from pypads_padre.injections.analysis.parameters import _get_relevant_parameters, _summaries
+
+        def model():
+            return torch.nn.Sequential(torch.nn.Linear(10, 20), torch.nn.ReLU(), torch.nn.Linear(20, 2))
+
+        first = model()
+        first[2].bias.requires_grad = False
+        summary = _get_relevant_parameters(first)
+
+        # --------------------------- asserts ---------------------------
+        self.assertEqual(summary["Sequential.Total_parameters"], 10 * 20 + 20 + 20 * 2 + 2)
+        # Trainable parameters are counted per parameter. The frozen bias isn't counted with the trainable weight.
+        self.assertEqual(summary["Sequential.Trainable_parameters"], 10 * 20 + 20 + 20 * 2)
+        self.assertEqual(summary["Sequential.Number_of_layers"], 3)
+        self.assertEqual(summary["Linear.in_features"], 20)
+
+        # Every direct parameter of a layer is counted, also the weights of recurrent layers
+        recurrent = _get_relevant_parameters(torch.nn.Sequential(torch.nn.LSTM(4, 8)))
+        self.assertEqual(recurrent["LSTM.parameters"], 4 * 8 * 4 + 4 * 8 * 8 + 2 * 4 * 8)
+        self.assertEqual(recurrent["Sequential.Trainable_parameters"], 4 * 8 * 4 + 4 * 8 * 8 + 2 * 4 * 8)
+
+        # The summary is cached per model until the signature of its parameters changes
+        cached = _summaries[first]
+        self.assertEqual(_get_relevant_parameters(first), summary)
+        self.assertIs(_summaries[first], cached)
+        first[2].bias.requires_grad = True
+        self.assertEqual(_get_relevant_parameters(first)["Sequential.Trainable_parameters"],
+                         10 * 20 + 20 + 20 * 2 + 2)
+        self.assertEqual(_get_relevant_parameters(model()), _get_relevant_parameters(first))
+        # !-------------------------- asserts ---------------------------
+
+    def test_model_statistics(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(autostart=True)
+
+        import torch
+        from pypads_padre.injections.analysis.models import ModelTO
+        model = torch.nn.Sequential(torch.nn.Linear(4, 8), torch.nn.ReLU(), torch.nn.Linear(8, 2))
+        to = ModelTO(Model="Sequential", parent=tracker.api.get_programmatic_output())
+        to.watch(model, sample_every=2, histogram_bins=4)
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+        for _ in range(6):
+            optimizer.zero_grad()
+            model(torch.randn(16, 4)).sum().backward()
+            optimizer.step()
+        model.eval()
+        model(torch.randn(16, 4))
+
+        # --------------------------- asserts ---------------------------
+        self.assertEqual(to.number_of_samples, 3)
+        self.assertEqual(len(to.statistics_artifacts), 1)
+        self.assertEqual(to.parameter_names, ["0.weight", "0.bias", "2.weight", "2.bias"])
+        to.store()
+        self.assertEqual(len(model._forward_pre_hooks), 0)
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_watched_subclass(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        from pypads.bindings import hooks
+        tracker = PyPads(hooks={**hooks.DEFAULT_HOOK_MAPPING,
+                                "model": {"on": ["pypads_model"], "with": {"sample_every": 2}}}, autostart=True)
+
+        import torch
+
+        @tracker.decorators.watch(track="model")
+        class Base(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.first = torch.nn.Linear(4, 8)
+
+        @tracker.decorators.watch(track="model")
+        class Net(Base):
+            def __init__(self):
+                super().__init__()
+                self.second = torch.nn.Linear(8, 2)
+
+            def forward(self, x):
+                return self.second(torch.relu(self.first(x)))
+
+        model = Net()
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+        for _ in range(4):
+            optimizer.zero_grad()
+            model(torch.randn(16, 4)).sum().backward()
+            optimizer.step()
+
+        # --------------------------- asserts ---------------------------
+        # The model is watched once after the layers of the subclass were created
+        to, = tracker.cache.run_get("watched_models").values()
+        self.assertEqual(to.parameter_names, ["first.weight", "first.bias", "second.weight", "second.bias"])
+        self.assertEqual(len(model._forward_pre_hooks), 1)
+        self.assertTrue(len(model.second.weight._backward_hooks) > 0)
+
+        # The statistics of the unfinished epoch are stored when the run ends
+        tracker.api.end_run()
+        self.assertEqual(len(to.statistics_artifacts), 1)
+        self.assertEqual(len(model._forward_pre_hooks), 0)
+        # !-------------------------- asserts ---------------------------
+
+    def test_watch_all(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(autostart=True)
+
+        import torch
+
+        @tracker.decorators.watch(track="all")
+        class Net(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.linear = torch.nn.Linear(4, 2)
+
+            def forward(self, x):
+                return self.linear(x)
+
+        model = Net()
+
+        # --------------------------- asserts ---------------------------
+        # Weights and gradients are only watched if requested explicitly
+        self.assertFalse(tracker.cache.run_exists("watched_models"))
+        self.assertEqual(len(model._forward_pre_hooks), 0)
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_metric_buffer(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(autostart=True)
+
+        import torch
+        from pypads_padre.concepts.metrics import MetricWindow
+        from pypads_padre.injections.loggers.metric import MetricBuffer, MetricStream, AggregatedMetricTO
+        to = AggregatedMetricTO(name="loss", description="Loss of a batch", documentation="",
+                                parent=tracker.api.get_programmatic_output())
+        buffer = MetricBuffer(MetricStream(to, MetricWindow(aggregates=["last"])), size=4)
+        for step in range(4):
+            buffer.add(torch.tensor(float(step)), step=step * 10)
+        self.assertTrue(buffer.full)
+        buffer.flush(tracker)
+
+        # --------------------------- asserts ---------------------------
+        history = tracker.backend.mlf.get_metric_history(tracker.api.active_run().info.run_id, "loss")
+        self.assertEqual(sorted((m.step, m.value) for m in history), [(0, 0.0), (10, 1.0), (20, 2.0), (30, 3.0)])
+        self.assertFalse(buffer.full)
+        self.assertEqual(to.number_of_points, 4)
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()
+
+    def test_metric_aggregation(self):
+        # --------------------------- setup of the tracking ---------------------------
+        # Activate tracking of pypads
+        from pypads.app.base import PyPads
+        tracker = PyPads(autostart=True)
+
+        from pypads_padre.concepts.metrics import MetricWindow, read_points
+        from pypads_padre.injections.loggers.metric import MetricStream, AggregatedMetricTO
+        to = AggregatedMetricTO(name="loss", description="Loss of a batch", documentation="",
+                                parent=tracker.api.get_programmatic_output())
+        stream = MetricStream(to, MetricWindow(steps=4, aggregates=["mean", "max"]), exact=True)
+        stream.add(tracker, list(range(10)), [float(v) for v in range(10)], [0] * 10)
+        points = read_points(stream.points.path)
+        stream.close(tracker)
+
+        # --------------------------- asserts ---------------------------
+        run_id = tracker.api.active_run().info.run_id
+        means = tracker.backend.mlf.get_metric_history(run_id, "loss.mean")
+        self.assertEqual(sorted((m.step, m.value) for m in means), [(3, 1.5), (7, 5.5), (9, 8.5)])
+        maxima = tracker.backend.mlf.get_metric_history(run_id, "loss.max")
+        self.assertEqual(sorted((m.step, m.value) for m in maxima), [(3, 3.0), (7, 7.0), (9, 9.0)])
+        self.assertEqual(list(points["value"]), [float(v) for v in range(10)])
+        self.assertEqual(to.number_of_points, 10)
+        self.assertEqual(to.number_of_windows, 3)
+        self.assertTrue(to.as_artifact)
+        # !-------------------------- asserts ---------------------------
+        tracker.api.end_run()